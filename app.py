@@ -1,16 +1,244 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Request, Response, abort, jsonify, make_response, render_template, request, redirect, url_for, flash
+import argparse
+import json
+import multiprocessing
 import os
 import sys
+import tempfile
 import threading
 import time
-import webbrowser
-from utils.formatter import check_pipeline_file, check_pipeline_text
+from werkzeug.exceptions import RequestEntityTooLarge
+from utils import metrics
+from utils.cache import DEFAULT_DISK_MAX_BYTES
+from utils.formatter import (
+    DISK_CACHE_ENV, MAX_LINE_LENGTH, check_pipeline_text, iter_pipeline_results, set_disk_cache,
+)
+from utils.incremental import format_document
+from utils.workers import WorkerPool
+
+# Uploads larger than this are refused with 413
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+# Uploads are kept in memory up to this size and spooled to a temporary file above it
+UPLOAD_SPOOL_THRESHOLD = 1024 * 1024
+# Encodings tried in order when decoding an upload
+UPLOAD_ENCODINGS = ('utf-8-sig', 'cp1252')
+
+class SpooledUploadRequest(Request):
+    """Request that keeps uploaded files in memory unless they exceed UPLOAD_SPOOL_THRESHOLD"""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=app.config['UPLOAD_SPOOL_THRESHOLD'])
 
 app = Flask(__name__)
+app.request_class = SpooledUploadRequest
 app.secret_key = 'fefj;efFWEFGGWEFWFWEFFWEF3R3R'
-app.config['UPLOAD_FOLDER'] = 'uploads/'
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
+app.config['UPLOAD_SPOOL_THRESHOLD'] = UPLOAD_SPOOL_THRESHOLD
+app.config['UPLOAD_ENCODINGS'] = UPLOAD_ENCODINGS
+# Desktop mode (auto-open browser, /shutdown) is only enabled by running app.py without 'serve'
+app.config['DESKTOP_MODE'] = False
+
+# Batches with at least this many documents per worker are spread over several pool workers
+API_PARALLEL_THRESHOLD = 8
+API_MAX_DOCUMENTS = 1000
+# Formatting jobs running at the same time, one per pool worker; further requests wait for a worker.
+# Gunicorn workers forked from the process that loaded this module share the limit, see share_format_slots()
+FORMAT_MAX_IN_FLIGHT = os.cpu_count() or 1
+# Seconds a request waits for a free slot before it gets 429
+FORMAT_QUEUE_TIMEOUT = 1
+# Seconds a request waits for its formatting before it is stopped with 503; also the maximum for ?timeout=
+FORMAT_TIMEOUT = 30
+FORMAT_TIMEOUT_MESSAGE = "Formatting took too long and was stopped"
+app.config['FORMAT_MAX_IN_FLIGHT'] = FORMAT_MAX_IN_FLIGHT
+app.config['FORMAT_QUEUE_TIMEOUT'] = FORMAT_QUEUE_TIMEOUT
+app.config['FORMAT_TIMEOUT'] = FORMAT_TIMEOUT
+# Directory for the cProfile dumps of API requests with ?profile=1; None disables profiling
+app.config['PROFILE_DIR'] = None
+# Directory of the persistent result cache shared by all workers; None disables it
+app.config['CACHE_DIR'] = os.environ.get(DISK_CACHE_ENV)
+app.config['CACHE_SIZE'] = DEFAULT_DISK_MAX_BYTES
+set_disk_cache(app.config['CACHE_DIR'], app.config['CACHE_SIZE'])
+
+requests_total = metrics.registry.counter(
+    "http_requests_total", "HTTP requests handled", ("endpoint", "method", "status"))
+request_seconds = metrics.registry.histogram(
+    "http_request_duration_seconds", "Time until the response headers, per endpoint", ("endpoint",))
+
+_pool = None
+_pool_lock = threading.Lock()
+_format_slots = None
+
+class FormatterBusy(Exception):
+    """All formatting slots stayed taken for FORMAT_QUEUE_TIMEOUT seconds"""
+
+class FormatterTimeout(Exception):
+    """Formatting did not finish within the timeout of the request"""
+
+def share_format_slots():
+    """
+    Creates the app.config['FORMAT_MAX_IN_FLIGHT'] formatting slots as a
+    semaphore that processes forked from this one share, so all gunicorn
+    workers together run at most that many formatting jobs. Must be called
+    before the workers are forked and before get_pool().
+    """
+    global _format_slots
+    _format_slots = multiprocessing.BoundedSemaphore(app.config['FORMAT_MAX_IN_FLIGHT'])
+
+def get_pool():
+    """
+    Pool of formatter processes, one per formatting slot, sized from
+    app.config['FORMAT_MAX_IN_FLIGHT'] on first use. The processes are
+    started as jobs need them; with share_format_slots() a job also needs
+    one of the slots shared with the other gunicorn workers.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(app.config['FORMAT_MAX_IN_FLIGHT'], initializer=set_disk_cache,
+                               initargs=(app.config['CACHE_DIR'], app.config['CACHE_SIZE']),
+                               slots=_format_slots)
+        return _pool
+
+# `gunicorn --preload app:app` loads this module before it forks the workers, so they can share the slots
+if 'gunicorn' in sys.modules:
+    share_format_slots()
+
+def acquire_workers(count=1):
+    """
+    Up to count idle pool workers, waiting FORMAT_QUEUE_TIMEOUT seconds for the first
+
+    Raises:
+        FormatterBusy: no worker became free in time.
+    """
+    workers = get_pool().acquire(count, timeout=app.config['FORMAT_QUEUE_TIMEOUT'])
+    if not workers:
+        raise FormatterBusy()
+    return workers
+
+def format_text(text, max_length, structured=False, document=None):
+    """
+    Formats one text in a pool worker; with a document key incrementally,
+    reusing what did not change since the previous version of that document
+    formatted by this worker
+    """
+    if document is not None:
+        return format_document(document, text, max_length=max_length)
+    return check_pipeline_text(text, max_length=max_length, structured=structured)
+
+def format_chunk(texts, max_length, phase_timing=False, structured=False, documents=None):
+    """
+    Runs in a pool worker: formats a slice of a batch, incrementally for the
+    texts that have a key in documents. With phase_timing the phase times are
+    returned as well, for the metrics of the server process.
+    """
+    documents = documents or [None] * len(texts)
+    if not phase_timing:
+        return [format_text(text, max_length, structured, document) for text, document in zip(texts, documents)], []
+    with metrics.collect_phase_times() as times:
+        results = [format_text(text, max_length, structured, document) for text, document in zip(texts, documents)]
+    return results, times
+
+def stream_chunks(body, pipeline_text, max_length, phase_timing=False):
+    """
+    Runs in a pool worker: the chunks of body(pipeline_text, max_length) as
+    ('chunk', text), followed by ('phases', times) with phase_timing.
+    """
+    if not phase_timing:
+        for chunk in body(pipeline_text, max_length):
+            yield 'chunk', chunk
+        return
+    with metrics.collect_phase_times() as times:
+        for chunk in body(pipeline_text, max_length):
+            yield 'chunk', chunk
+    yield 'phases', times
+
+def observe_phase_times(phase_times):
+    for phase, seconds in phase_times:
+        metrics.phase_observer(phase, seconds)
+
+def profile_documents(texts, max_length, structured=False):
+    """Format texts on the request thread under cProfile, without the result cache"""
+    import cProfile
+
+    for text in texts:
+        metrics.record_document(text)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        results = [check_pipeline_text(text, use_cache=False, max_length=max_length, structured=structured)
+                   for text in texts]
+    finally:
+        profiler.disable()
+    filename = f"format-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}.prof"
+    profiler.dump_stats(os.path.join(app.config['PROFILE_DIR'], filename))
+    return results, filename
 
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+def decode_upload(data):
+    """
+    Decode the bytes of an uploaded file, trying the encodings in
+    app.config['UPLOAD_ENCODINGS'] in order.
+
+    Returns:
+        (text, encoding) or (None, None) if none of the encodings fit.
+    """
+    for encoding in app.config['UPLOAD_ENCODINGS']:
+        try:
+            return data.decode(encoding), encoding
+        except UnicodeDecodeError:
+            continue
+    return None, None
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(error):
+    if request.path.startswith('/api/'):
+        return jsonify(error=f"Request is larger than {app.config['MAX_CONTENT_LENGTH']} bytes"), 413
+    flash(f"File is too large (maximum {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB)")
+    return redirect(url_for('index'))
+
+@app.errorhandler(FormatterBusy)
+def formatter_busy(error):
+    message = "The formatter is busy, please try again in a moment"
+    if request.path.startswith('/api/'):
+        response = jsonify(error=message)
+    else:
+        flash(message)
+        response = make_response(render_template('index.html', pipeline_text=request.form.get('pipeline')))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, round(app.config['FORMAT_QUEUE_TIMEOUT'])))
+    return response
+
+@app.errorhandler(FormatterTimeout)
+def formatter_timeout(error):
+    message = FORMAT_TIMEOUT_MESSAGE
+    if request.path.startswith('/api/'):
+        return jsonify(error=message), 503
+    flash(message)
+    return render_template('index.html', pipeline_text=request.form.get('pipeline')), 503
+
+@app.context_processor
+def inject_mode():
+    return {'desktop_mode': app.config['DESKTOP_MODE']}
+
+@app.before_request
+def start_request_timer():
+    request.environ['formatter.start'] = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    start = request.environ.get('formatter.start')
+    if start is not None:
+        request_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Counters and histograms of this process in the Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    return jsonify(status='ok')
 
 @app.route('/')
 def index():
@@ -29,10 +257,15 @@ def upload_file():
         return redirect(url_for('index'))
     
     if file:
-        filename = file.filename
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        formatted_output, errors, fixes_applied = check_pipeline_file(file_path)
+        # Read straight from the (in-memory or spooled) upload, nothing is written to the uploads folder
+        pipeline_text, encoding = decode_upload(file.stream.read())
+        file.close()
+        if pipeline_text is None:
+            flash(f"Could not decode file, tried: {', '.join(app.config['UPLOAD_ENCODINGS'])}")
+            return redirect(url_for('index'))
+        if encoding != app.config['UPLOAD_ENCODINGS'][0]:
+            flash(f"File was decoded as {encoding}")
+        (formatted_output, errors, fixes_applied), = format_documents([pipeline_text])
         if errors or fixes_applied:
             return render_template('index.html', formatted_output=formatted_output, errors=errors, fixes_applied=fixes_applied)
         else:
@@ -47,11 +280,274 @@ def format_pipeline_text():
     if not pipeline_text or pipeline_text.strip() == "":
         flash("No pipeline text provided")
         return redirect(url_for('index'))
-    formatted_output, errors, fixes_applied = check_pipeline_text(pipeline_text)
+    (formatted_output, errors, fixes_applied), = format_documents([pipeline_text])
     return render_template('index.html', formatted_output=formatted_output, errors=errors, fixes_applied=fixes_applied, pipeline_text=pipeline_text)
 
+def parse_api_documents():
+    """
+    Read the documents of an API request.
+
+    Accepts NDJSON (one {"id", "text"} object per line) or JSON: a single
+    {"text": ...} object, {"documents": [...]} or a plain list of documents.
+
+    Returns:
+        (documents, is_batch) where documents is a list of (id, text).
+    """
+    content_type = request.mimetype
+    if content_type in ('application/x-ndjson', 'application/ndjson'):
+        items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        is_batch = True
+    else:
+        payload = request.get_json(force=True)
+        if isinstance(payload, list):
+            items, is_batch = payload, True
+        elif isinstance(payload, dict) and 'documents' in payload:
+            items, is_batch = payload['documents'], True
+        else:
+            items, is_batch = [payload], False
+
+    documents = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'text': item}
+        if not isinstance(item, dict) or not isinstance(item.get('text'), str):
+            raise ValueError(f"Document {index}: expected an object with a 'text' string")
+        documents.append((item.get('id', index), item['text']))
+    if len(documents) > API_MAX_DOCUMENTS:
+        raise ValueError(f"Too many documents ({len(documents)}), the maximum is {API_MAX_DOCUMENTS}")
+    return documents, is_batch
+
+def parse_max_length():
+    """The optional ?max_length= query parameter of an API request"""
+    value = request.args.get('max_length')
+    if value is None:
+        return MAX_LINE_LENGTH
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError("max_length must be a positive integer")
+    return int(value)
+
+def parse_layout():
+    """
+    The optional ?layout= query parameter: 'lines' (default) or 'structured',
+    which formats from the parse tree. Returns True for 'structured'.
+    """
+    value = request.args.get('layout', 'lines')
+    if value not in ('lines', 'structured'):
+        raise ValueError("layout must be 'lines' or 'structured'")
+    return value == 'structured'
+
+def parse_timeout():
+    """The optional ?timeout= query parameter (seconds), capped at app.config['FORMAT_TIMEOUT']"""
+    limit = app.config['FORMAT_TIMEOUT']
+    value = request.args.get('timeout')
+    if value is None:
+        return limit
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = 0
+    if not timeout > 0:
+        raise ValueError("timeout must be a positive number of seconds")
+    return min(timeout, limit)
+
+def format_documents(texts, max_length=MAX_LINE_LENGTH, timeout=None, structured=False, documents=None):
+    """
+    Format a list of pipeline texts on the worker pool; with structured from
+    their parse trees, with documents (a key per text) incrementally.
+
+    Every request holds at least one pool worker; large batches also take
+    the workers that are idle at that moment and are split over them. Workers
+    that are still formatting after timeout seconds are terminated and
+    replaced, so a pathological input does not keep its slot.
+
+    Raises:
+        FormatterBusy: no worker became free within FORMAT_QUEUE_TIMEOUT seconds.
+        FormatterTimeout: the formatting took longer than timeout seconds.
+    """
+    workers = acquire_workers(max(1, len(texts) // API_PARALLEL_THRESHOLD))
+    for text in texts:
+        metrics.record_document(text)
+
+    chunksize = -(-len(texts) // len(workers))
+    phase_timing = metrics.phase_observer is not None
+    jobs = [(texts[start:start + chunksize], max_length, phase_timing, structured,
+             documents and documents[start:start + chunksize])
+            for start in range(0, len(texts), chunksize)]
+    try:
+        chunks = get_pool().run(workers, format_chunk, jobs,
+                                timeout if timeout is not None else app.config['FORMAT_TIMEOUT'])
+    except TimeoutError:
+        raise FormatterTimeout()
+    results = []
+    for chunk_results, phase_times in chunks:
+        results.extend(chunk_results)
+        observe_phase_times(phase_times)
+    return results
+
+@app.route('/api/v1/format', methods=['POST'])
+def api_format():
+    try:
+        documents, is_batch = parse_api_documents()
+        max_length = parse_max_length()
+        structured = parse_layout()
+        timeout = parse_timeout()
+        profile = request.args.get('profile') not in (None, '', '0')
+        if profile and not app.config['PROFILE_DIR']:
+            raise ValueError("Profiling is not enabled on this server")
+        incremental = request.args.get('incremental') not in (None, '', '0')
+        if incremental and structured:
+            raise ValueError("incremental formatting only works with layout=lines")
+    except RequestEntityTooLarge:
+        raise
+    except ValueError as e:
+        # json.JSONDecodeError is a ValueError as well
+        return jsonify(error=str(e)), 400
+    except Exception:
+        return jsonify(error="Request body is not valid JSON"), 400
+
+    texts = [text for _, text in documents]
+    # The id names the document whose previous version is reused
+    document_keys = [str(doc_id) for doc_id, _ in documents] if incremental else None
+    profile_name = None
+    if profile:
+        formatted_documents, profile_name = profile_documents(texts, max_length, structured)
+    else:
+        formatted_documents = format_documents(texts, max_length, timeout, structured, document_keys)
+
+    results = []
+    for (doc_id, _), (formatted, errors, fixes_applied) in zip(documents, formatted_documents):
+        results.append({
+            'id': doc_id,
+            'ok': formatted is not None,
+            'formatted': formatted,
+            'errors': errors,
+            'fixes_applied': [str(fix) for fix in fixes_applied],
+        })
+
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        body = "".join(json.dumps(result) + "\n" for result in results)
+        response = Response(body, mimetype='application/x-ndjson')
+    elif is_batch:
+        response = jsonify(results=results)
+    else:
+        response = jsonify(results[0])
+    if profile_name is not None:
+        response.headers['X-Profile-Dump'] = profile_name
+    return response
+
+def streamed_response(pipeline_text, body, max_length, timeout_message, mimetype, headers=None, timeout=None):
+    """
+    Response that sends the chunks of body(pipeline_text, max_length) while a
+    pool worker produces them. The worker is held until the response is
+    closed, also when the client goes away; when the formatting takes longer
+    than timeout seconds it is stopped and timeout_message ends the response.
+    """
+    worker, = acquire_workers()
+    metrics.record_document(pipeline_text)
+    phase_timing = metrics.phase_observer is not None
+    chunks = get_pool().stream(worker, stream_chunks, (body, pipeline_text, max_length, phase_timing),
+                               timeout if timeout is not None else app.config['FORMAT_TIMEOUT'])
+
+    def send():
+        try:
+            for kind, value in chunks:
+                if kind == 'chunk':
+                    yield value
+                else:
+                    observe_phase_times(value)
+        except TimeoutError:
+            yield timeout_message
+
+    response = Response(send(), mimetype=mimetype, headers=headers)
+    response.call_on_close(chunks.close)
+    return response
+
+def download_body(pipeline_text, max_length):
+    """The formatted pipeline, followed by the errors and fixes as a comment section"""
+    errors = []
+    fixes = []
+    for event, value in iter_pipeline_results(pipeline_text, max_length):
+        if event == 'lines':
+            yield "\n".join(value) + "\n"
+        elif event == 'error':
+            errors.append(value)
+        else:
+            fixes.append(value)
+    if errors or fixes:
+        report = ["", "# Logstash Pipeline Formatter report"]
+        report += [f"# {message}" for message in errors]
+        report += [f"# Fixed: {fix}" for fix in fixes]
+        yield "\n".join(report) + "\n"
+
+def event_stream_body(pipeline_text, max_length):
+    """The results of iter_pipeline_results as NDJSON events, ending with a 'done' event"""
+    counts = {'lines': 0, 'error': 0, 'fix': 0}
+    for event, value in iter_pipeline_results(pipeline_text, max_length):
+        if event == 'lines':
+            counts['lines'] += len(value)
+            yield json.dumps({'event': 'lines', 'lines': value}) + "\n"
+        else:
+            counts[event] += 1
+            yield json.dumps({'event': event, 'message': str(value)}) + "\n"
+    yield json.dumps({'event': 'done', 'lines': counts['lines'], 'errors': counts['error'],
+                      'fixes': counts['fix']}) + "\n"
+
+@app.route('/download', methods=['POST'])
+def download_formatted():
+    """Formatted pipeline as a file download, streamed while it is formatted"""
+    file = request.files.get('file')
+    if file is not None and file.filename:
+        pipeline_text, _ = decode_upload(file.stream.read())
+        file.close()
+        if pipeline_text is None:
+            flash(f"Could not decode file, tried: {', '.join(app.config['UPLOAD_ENCODINGS'])}")
+            return redirect(url_for('index'))
+        filename = os.path.basename(file.filename)
+    else:
+        pipeline_text = request.form.get("pipeline")
+        filename = "pipeline.conf"
+    if not pipeline_text or pipeline_text.strip() == "":
+        flash("No pipeline text provided")
+        return redirect(url_for('index'))
+    return streamed_response(pipeline_text, download_body, MAX_LINE_LENGTH,
+                             f"\n# {FORMAT_TIMEOUT_MESSAGE}\n", 'text/plain',
+                             {'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/v1/format/stream', methods=['POST'])
+def api_format_stream():
+    """
+    Format one document and stream the result as NDJSON events: 'lines' with
+    the next formatted lines, 'error' and 'fix' as they are found, and 'done'.
+    The body is the plain pipeline text or a JSON {"text": ...} object.
+    """
+    try:
+        if request.mimetype == 'application/json':
+            payload = request.get_json(force=True)
+            if not isinstance(payload, dict) or not isinstance(payload.get('text'), str):
+                raise ValueError("Expected an object with a 'text' string")
+            pipeline_text = payload['text']
+        else:
+            pipeline_text = request.get_data(as_text=True)
+        max_length = parse_max_length()
+        if parse_layout():
+            raise ValueError("layout=structured needs the whole pipeline and is only supported by /api/v1/format")
+        timeout = parse_timeout()
+    except RequestEntityTooLarge:
+        raise
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except Exception:
+        return jsonify(error="Request body is not valid JSON"), 400
+    return streamed_response(pipeline_text, event_stream_body, max_length,
+                             json.dumps({'event': 'error', 'message': FORMAT_TIMEOUT_MESSAGE}) + "\n",
+                             'application/x-ndjson', timeout=timeout)
+
 @app.route('/shutdown', methods=['POST'])
 def shutdown():
+    # A shared server must not be stoppable from the browser
+    if not app.config['DESKTOP_MODE']:
+        abort(404)
+
     def shutdown_server():
         time.sleep(1)  # Give time for response to be sent
         os._exit(0)
@@ -60,19 +556,116 @@ def shutdown():
     thread.start()
     return "Shutting down..."
 
-def open_browser():
-    """Open browser after a short delay"""
-    time.sleep(1.5)
-    webbrowser.open('http://127.0.0.1:5001')
+def run_desktop(port=5001, open_browser=True, started=None):
+    """
+    Single-user mode: development server on localhost. The browser is opened
+    as soon as the server listens; started is the time.perf_counter() value at
+    launch, to report the startup time.
+    """
+    import webbrowser
+    from werkzeug.serving import make_server
 
-if __name__ == '__main__':
+    app.config['DESKTOP_MODE'] = True
     print("Starting Logstash Pipeline Formatter...")
-    print("Opening browser in 1.5 seconds...")
-    
-    # Start browser opening in background
-    browser_thread = threading.Thread(target=open_browser)
-    browser_thread.daemon = True
-    browser_thread.start()
-    
-    # Start Flask app
-    app.run(debug=False, port=5001, use_reloader=False)
\ No newline at end of file
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    url = f"http://127.0.0.1:{server.server_port}"
+    if started is not None:
+        print(f"Ready in {time.perf_counter() - started:.2f} s")
+    print(f"Listening on {url}", flush=True)
+
+    if open_browser:
+        threading.Thread(target=webbrowser.open, args=(url,), daemon=True).start()
+    server.serve_forever()
+
+def run_server(host, port, workers, keepalive, timeout):
+    """
+    Shared service mode: gunicorn with multiple worker processes, or waitress
+    (multiple threads) where gunicorn is not available, such as on Windows.
+    The formatting slots in app.config['FORMAT_MAX_IN_FLIGHT'] are for the
+    host: the gunicorn workers share them.
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is not None:
+        class FormatterServer(BaseApplication):
+            def __init__(self, options):
+                self.options = options
+                super().__init__()
+
+            def load_config(self):
+                for key, value in self.options.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return app
+
+        # Each gunicorn worker gets its own formatter pool, but a job needs one of the slots they all share
+        share_format_slots()
+        print(f"Serving Logstash Pipeline Formatter on http://{host}:{port} with {workers} gunicorn workers")
+        FormatterServer({
+            'bind': f"{host}:{port}",
+            'workers': workers,
+            'keepalive': keepalive,
+            'timeout': timeout,
+        }).run()
+        return
+
+    try:
+        from waitress import serve
+    except ImportError:
+        print("Serve mode needs gunicorn or waitress: pip install -r requirements.txt")
+        sys.exit(1)
+    print(f"Serving Logstash Pipeline Formatter on http://{host}:{port} with {workers} waitress threads")
+    serve(app, host=host, port=port, threads=workers, channel_timeout=keepalive,
+          max_request_body_size=app.config['MAX_CONTENT_LENGTH'])
+
+def main(argv=None, started=None):
+    parser = argparse.ArgumentParser(description="Logstash Pipeline Formatter")
+    parser.add_argument("mode", nargs="?", choices=["desktop", "serve"], default="desktop",
+                        help="desktop (default): local server and browser; serve: multi-worker production server")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on in serve mode")
+    parser.add_argument("--port", type=int, default=5001, help="Port to listen on (0: any free port in desktop mode)")
+    parser.add_argument("--no-browser", action="store_true", help="Do not open the browser in desktop mode")
+    parser.add_argument("--workers", type=int, default=(os.cpu_count() or 1) * 2 + 1,
+                        help="Number of worker processes (gunicorn) or threads (waitress)")
+    parser.add_argument("--keepalive", type=int, default=5, help="Seconds to keep idle connections open")
+    parser.add_argument("--timeout", type=int, default=120, help="Seconds before a busy worker is restarted")
+    parser.add_argument("--max-in-flight", type=int, default=FORMAT_MAX_IN_FLIGHT,
+                        help="Formatting jobs running at the same time on the host, shared by the workers; "
+                             "more requests get 429")
+    parser.add_argument("--format-timeout", type=float, default=FORMAT_TIMEOUT,
+                        help="Seconds before a formatting job is stopped and the request gets 503")
+    parser.add_argument("--phase-timing", action="store_true",
+                        help="Time the formatter phases for /metrics (costs some formatting speed)")
+    parser.add_argument("--profile-dir",
+                        help="Allow ?profile=1 on the API; cProfile dumps are written to this directory")
+    parser.add_argument("--cache-dir", default=app.config['CACHE_DIR'],
+                        help=f"Persistent result cache shared by the workers (default: ${DISK_CACHE_ENV})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_DISK_MAX_BYTES // (1024 * 1024),
+                        help="Maximum size of the result cache in MB")
+    parser.add_argument("--max-request-size", type=int, default=MAX_UPLOAD_SIZE // (1024 * 1024),
+                        help="Maximum request size in MB")
+    args = parser.parse_args(argv)
+
+    if args.mode == "serve":
+        app.config['MAX_CONTENT_LENGTH'] = args.max_request_size * 1024 * 1024
+        app.config['FORMAT_MAX_IN_FLIGHT'] = args.max_in_flight
+        app.config['FORMAT_TIMEOUT'] = args.format_timeout
+        app.config['CACHE_DIR'] = args.cache_dir
+        app.config['CACHE_SIZE'] = args.cache_size * 1024 * 1024
+        set_disk_cache(app.config['CACHE_DIR'], app.config['CACHE_SIZE'])
+        if args.phase_timing:
+            metrics.enable_phase_timing()
+        if args.profile_dir:
+            os.makedirs(args.profile_dir, exist_ok=True)
+            app.config['PROFILE_DIR'] = os.path.abspath(args.profile_dir)
+        run_server(args.host, args.port, args.workers, args.keepalive, args.timeout)
+    else:
+        run_desktop(args.port, open_browser=not args.no_browser, started=started)
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Needed for the process pool in the packaged executable
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the Logstash pipeline formatter.
+Formats synthetic pipelines (see generator.py) of increasing size and reports
+throughput, peak memory and per-phase timings. Results can be saved as JSON
+to compare runs:
+
+    python benchmarks/bench_formatter.py --lines 1000 10000 100000 --json before.json
+    python benchmarks/bench_formatter.py --example --copies 50
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generator import PipelineGenerator
+from utils.formatter import (
+    _FormatState, _close_open_blocks, _finish_output, _format_token_lines, _wrap_lines,
+    format_logstash_pipeline,
+)
+from utils.tokenizer import tokenize
+
+EXAMPLE_FILE = Path(__file__).resolve().parent.parent / "example" / "man_filebeat.conf"
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def example_content(copies):
+    """The bundled example pipeline repeated `copies` times"""
+    return "\n".join([EXAMPLE_FILE.read_text()] * copies)
+
+
+def time_phases(content):
+    """
+    Run the stages of format_logstash_pipeline one after the other and return
+    the time spent in each, in seconds. In format_logstash_pipeline the stages
+    are interleaved line by line, so the sum is a little higher than its time.
+    """
+    timings = {}
+    start = time.perf_counter()
+    token_lines = list(tokenize(content))
+    timings['tokenize'] = time.perf_counter() - start
+
+    errors = []
+    fixes_applied = []
+    state = _FormatState()
+    start = time.perf_counter()
+    formatted_lines = list(_format_token_lines(token_lines, errors, fixes_applied, state))
+    timings['format_lines'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    formatted_lines = list(_close_open_blocks(formatted_lines, state, errors, fixes_applied))
+    timings['repair'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    wrapped_lines = list(_wrap_lines(formatted_lines, fixes_applied))
+    timings['wrap'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _finish_output(wrapped_lines, errors, fixes_applied)
+    timings['finish'] = time.perf_counter() - start
+    return timings
+
+
+def run_benchmark(content, rounds):
+    """
+    Benchmark format_logstash_pipeline on content.
+
+    Returns a dict with the best wall time, throughput, peak traced memory and
+    the per-phase timings of the fastest phase run.
+    """
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        format_logstash_pipeline(content)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    phases = None
+    for _ in range(rounds):
+        timings = time_phases(content)
+        if phases is None or sum(timings.values()) < sum(phases.values()):
+            phases = timings
+
+    # Memory is measured in a separate run, tracing slows the formatter down a lot
+    tracemalloc.start()
+    formatted, errors, fixes_applied = format_logstash_pipeline(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    line_count = content.count("\n") + 1
+    size_mb = len(content.encode('utf-8')) / (1024 * 1024)
+    return {
+        'lines': line_count,
+        'megabytes': round(size_mb, 3),
+        'best_seconds': best,
+        'lines_per_second': line_count / best,
+        'mb_per_second': size_mb / best,
+        'peak_memory_mb': round(peak / (1024 * 1024), 3),
+        'errors': len(errors),
+        'fixes': len(fixes_applied),
+        'phases': phases,
+    }
+
+
+def print_result(name, result):
+    print(f"{name}")
+    print(f"  Lines:        {result['lines']:,} ({result['megabytes']:.2f} MB)")
+    print(f"  Best time:    {result['best_seconds']:.3f} s")
+    print(f"  Throughput:   {result['lines_per_second']:,.0f} lines/s, {result['mb_per_second']:.2f} MB/s")
+    print(f"  Peak memory:  {result['peak_memory_mb']:.1f} MB")
+    print(f"  Diagnostics:  {result['errors']} errors, {result['fixes']} fixes")
+    total = sum(result['phases'].values()) or 1
+    for phase, seconds in result['phases'].items():
+        print(f"    {phase:<13} {seconds:8.3f} s  {100 * seconds / total:5.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark format_logstash_pipeline")
+    parser.add_argument("--lines", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Sizes of the generated pipelines in lines (default: 1000 10000 100000)")
+    parser.add_argument("--depth", type=int, default=3, help="Maximum conditional nesting depth")
+    parser.add_argument("--grok-density", type=float, default=0.3, help="Share of plugins that are grok blocks")
+    parser.add_argument("--template-density", type=float, default=0.2, help="Share of values with %%{} templates")
+    parser.add_argument("--long-lines", type=float, default=0.05,
+                        help="Share of plugins with a line that needs wrapping")
+    parser.add_argument("--broken", type=float, default=0.0,
+                        help="Share of plugins with a missing closing brace or quote")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the pipeline generator")
+    parser.add_argument("--example", action="store_true",
+                        help="Benchmark the bundled example pipeline instead of generated ones")
+    parser.add_argument("--copies", type=int, default=50, help="How often the example pipeline is repeated")
+    parser.add_argument("--rounds", type=int, default=3, help="Number of timed runs (best is reported)")
+    parser.add_argument("--json", metavar="PATH", help="Write the results to PATH as JSON")
+    args = parser.parse_args()
+
+    settings = {
+        'depth': args.depth,
+        'grok_density': args.grok_density,
+        'template_density': args.template_density,
+        'long_line_ratio': args.long_lines,
+        'broken_ratio': args.broken,
+        'seed': args.seed,
+    }
+    if args.example:
+        cases = [(f"example x{args.copies}", example_content(args.copies))]
+    else:
+        cases = [(f"generated {size} lines", PipelineGenerator(**settings).generate(size)) for size in args.lines]
+
+    results = []
+    for name, content in cases:
+        result = run_benchmark(content, args.rounds)
+        result['name'] = name
+        print_result(name, result)
+        results.append(result)
+
+    if args.json:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'rounds': args.rounds,
+            'generator': None if args.example else settings,
+            'results': results,
+        }
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nResults written to {args.json}")
@@ -0,0 +1,121 @@
+"""
+Synthetic Logstash pipeline generator for the formatter benchmarks.
+
+Generates input/filter/output pipelines of a given size with configurable
+nesting depth, grok and template density, long lines (which the formatter
+wraps) and deliberately broken braces and quotes.
+"""
+
+import random
+
+GROK_PATTERNS = [
+    "%{TIMESTAMP_ISO8601:timestamp} %{LOGLEVEL:log.level} %{GREEDYDATA:log.message}",
+    "\\[%{TIMESTAMP_ISO8601:timestamp}\\]\\[%{LOGLEVEL:log.level}\\s*\\]\\[%{DATA:logger}\\]\\s+%{GREEDYDATA:msg}",
+    "%{IPORHOST:client.ip} %{USER:ident} %{USER:auth} \\[%{HTTPDATE:timestamp}\\] \\\"%{WORD:verb} %{DATA:request}\\\"",
+    "%{SYSLOGTIMESTAMP:timestamp} %{SYSLOGHOST:host} %{DATA:program}(?:\\[%{POSINT:pid}\\])?: %{GREEDYDATA:msg}",
+]
+TAGS = ["logstashplainlog", "externalip", "citrixlicense", "softwareinventory", "dfs", "wsus", "vss", "fsinventory"]
+FIELDS = ["message", "host", "[log][level]", "[@metadata][fingerprint]", "domain", "user.name", "event.code"]
+
+
+class PipelineGenerator:
+    """
+    Builds a synthetic pipeline line by line.
+
+    Args:
+        depth (int): Maximum nesting depth of conditionals inside the filter section.
+        grok_density (float): Share of filter plugins that are grok blocks.
+        template_density (float): Share of settings that use %{field} templates.
+        long_line_ratio (float): Share of plugins with a line longer than the wrap width.
+        broken_ratio (float): Share of plugins with a missing closing brace or quote.
+        seed (int): Seed for the random generator, so runs are comparable.
+    """
+
+    def __init__(self, depth=3, grok_density=0.3, template_density=0.2, long_line_ratio=0.05,
+                 broken_ratio=0.0, seed=0):
+        self.depth = depth
+        self.grok_density = grok_density
+        self.template_density = template_density
+        self.long_line_ratio = long_line_ratio
+        self.broken_ratio = broken_ratio
+        self.random = random.Random(seed)
+
+    def generate(self, line_count):
+        """Returns a pipeline of roughly line_count lines as a string."""
+        lines = []
+        self._input(lines)
+        lines.append("")
+        lines.append("filter {")
+        # Reserve room for the output section
+        while len(lines) < line_count - 12:
+            self._conditional(lines, 1, line_count - 12)
+        lines.append("}")
+        lines.append("")
+        self._output(lines)
+        return "\n".join(lines) + "\n"
+
+    def _indent(self, level):
+        return "    " * level
+
+    def _value(self):
+        if self.random.random() < self.template_density:
+            return f'"%{{{self.random.choice(FIELDS)}}}-%{{+YYYY.MM.dd}}"'
+        return f'"{self.random.choice(TAGS)}"'
+
+    def _input(self, lines):
+        lines.append("input {")
+        lines.append("    beats {")
+        lines.append("        port => 5044")
+        lines.append('        ssl => false')
+        lines.append("    }")
+        lines.append("}")
+
+    def _output(self, lines):
+        lines.append("output {")
+        lines.append("    elasticsearch {")
+        lines.append('        hosts => ["https://localhost:9200"]')
+        lines.append('        index => "logs-%{[@metadata][beat]}-%{+YYYY.MM.dd}"')
+        lines.append("    }")
+        lines.append("}")
+
+    def _conditional(self, lines, level, limit):
+        tag = self.random.choice(TAGS)
+        lines.append(f'{self._indent(level)}if "{tag}" in [tags] {{')
+        for _ in range(self.random.randint(1, 4)):
+            if len(lines) >= limit:
+                break
+            if level < self.depth and self.random.random() < 0.3:
+                self._conditional(lines, level + 1, limit)
+            else:
+                self._plugin(lines, level + 1)
+        lines.append(f"{self._indent(level)}}}")
+        if self.random.random() < 0.5 and len(lines) < limit:
+            lines.append(f'{self._indent(level)}else if "{self.random.choice(TAGS)}" in [tags] {{')
+            self._plugin(lines, level + 1)
+            lines.append(f"{self._indent(level)}}}")
+
+    def _plugin(self, lines, level):
+        indent = self._indent(level)
+        inner = self._indent(level + 1)
+        broken = self.random.random() < self.broken_ratio
+        if self.random.random() < self.grok_density:
+            lines.append(f"{indent}grok {{")
+            pattern = self.random.choice(GROK_PATTERNS)
+            lines.append(f'{inner}match => {{ "message" => "{pattern}" }}')
+        else:
+            lines.append(f"{indent}mutate {{")
+            for _ in range(self.random.randint(1, 3)):
+                lines.append(f"{inner}add_field => {{ \"{self.random.choice(FIELDS)}\" => {self._value()} }}")
+        if self.random.random() < self.long_line_ratio:
+            if self.random.random() < 0.5:
+                code = "; ".join(f"event.set('f{i}', event.get('{self.random.choice(FIELDS)}'))" for i in range(8))
+                lines.append(f'{inner}code => "{code}"')
+            else:
+                # A single-quoted string must not be wrapped either
+                message = " ".join(self.random.choice(TAGS) for _ in range(20))
+                lines.append(f"{inner}add_field => {{ 'message' => '{message}' }}")
+        if broken and self.random.random() < 0.5:
+            # Missing closing quote
+            lines.append(f'{inner}remove_tag => "{self.random.choice(TAGS)}')
+        if not (broken and self.random.random() < 0.5):
+            lines.append(f"{indent}}}")
@@ -4,19 +4,42 @@ Build script for Logstash Pipeline Formatter
 Creates a standalone executable using PyInstaller
 """
 
+import argparse
+import csv
 import os
+import socket
 import sys
 import shutil
 import subprocess
+import time
+import urllib.request
+from datetime import datetime
 from pathlib import Path
 
-def build_executable():
-    """Build the standalone executable"""
+APP_NAME = "LogstashPipelineFormatter"
+# Startup times of every build are appended here, so they can be compared between builds
+STARTUP_LOG = "startup_times.csv"
+# Seconds to wait for the built executable to answer on /healthz
+STARTUP_TIMEOUT = 120
+
+def executable_path(dist_dir, onedir):
+    """Path of the built executable; a onedir build puts it in its own folder"""
+    exe_name = f"{APP_NAME}.exe" if sys.platform.startswith('win') else APP_NAME
+    return dist_dir / APP_NAME / exe_name if onedir else dist_dir / exe_name
+
+def build_executable(onedir=False, console=False):
+    """
+    Build the standalone executable.
+
+    onedir builds a folder with the executable and its libraries, which
+    starts faster than a single file because nothing has to be unpacked
+    to a temporary directory on every launch.
+    """
     print("Building Logstash Pipeline Formatter executable...")
     
     # Define paths
     script_dir = Path(__file__).parent
-    app_file = script_dir / "app.py"
+    app_file = script_dir / "launcher.py"
     build_dir = script_dir / "build"
     dist_dir = script_dir / "dist"
     
@@ -30,17 +53,19 @@ def build_executable():
     separator = ";" if sys.platform.startswith('win') else ":"
     cmd = [
         sys.executable, "-m", "PyInstaller",
-        "--onefile",                    # Single executable
-        "--windowed",                   # No console window (for Windows)
-        "--name=LogstashPipelineFormatter",
+        "--onedir" if onedir else "--onefile",
+        f"--name={APP_NAME}",
         f"--add-data=templates{separator}templates",
         f"--add-data=static{separator}static",
         f"--add-data=utils{separator}utils",
         "--hidden-import=werkzeug.security",
         "--hidden-import=jinja2",
         "--hidden-import=flask",
+        "--exclude-module=tkinter",     # Pulled in by the standard library, never used
         str(app_file)
     ]
+    if not console:
+        cmd.insert(4, "--windowed")     # No console window (for Windows); the cli mode needs --console there
     
     print(f"Running: {' '.join(cmd)}")
     
@@ -49,8 +74,7 @@ def build_executable():
         print("Build completed successfully!")
         
         # Check if executable was created
-        exe_name = "LogstashPipelineFormatter.exe" if sys.platform.startswith('win') else "LogstashPipelineFormatter"
-        exe_path = dist_dir / exe_name
+        exe_path = executable_path(dist_dir, onedir)
         
         if exe_path.exists():
             print(f"Executable created: {exe_path}")
@@ -64,7 +88,64 @@ def build_executable():
     
     return True
 
-def create_distribution_package():
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def measure_startup(onedir=False):
+    """
+    Time the built executable from launch until the server answers on
+    /healthz, and until the headless cli mode has started, and append the
+    results to STARTUP_LOG.
+
+    Returns:
+        (server_seconds, cli_seconds); a value is None if that mode did not start.
+    """
+    script_dir = Path(__file__).parent
+    exe_path = executable_path(script_dir / "dist", onedir)
+    port = free_port()
+
+    start = time.perf_counter()
+    process = subprocess.Popen([str(exe_path), "--no-browser", "--port", str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server_seconds = None
+    try:
+        while time.perf_counter() - start < STARTUP_TIMEOUT and process.poll() is None:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1):
+                    server_seconds = time.perf_counter() - start
+                    break
+            except OSError:
+                time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait()
+
+    start = time.perf_counter()
+    result = subprocess.run([str(exe_path), "cli", "--help"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    cli_seconds = time.perf_counter() - start if result.returncode == 0 else None
+
+    log_path = script_dir / STARTUP_LOG
+    new_log = not log_path.exists()
+    with open(log_path, 'a', newline='') as log:
+        writer = csv.writer(log)
+        if new_log:
+            writer.writerow(["date", "platform", "mode", "server_ready_s", "cli_s"])
+        writer.writerow([
+            datetime.now().isoformat(timespec='seconds'), sys.platform, "onedir" if onedir else "onefile",
+            f"{server_seconds:.2f}" if server_seconds is not None else "",
+            f"{cli_seconds:.2f}" if cli_seconds is not None else "",
+        ])
+
+    print(f"Startup: server ready in {server_seconds:.2f} s" if server_seconds is not None
+          else "Startup: server did not answer on /healthz")
+    print(f"Startup: cli mode in {cli_seconds:.2f} s" if cli_seconds is not None
+          else "Startup: cli mode failed")
+    print(f"Recorded in {log_path}")
+    return server_seconds, cli_seconds
+
+def create_distribution_package(onedir=False):
     """Create a complete distribution package"""
     print("Creating distribution package...")
     
@@ -78,10 +159,12 @@ def create_distribution_package():
     package_dir.mkdir()
     
     # Copy executable
-    exe_name = "LogstashPipelineFormatter.exe" if sys.platform.startswith('win') else "LogstashPipelineFormatter"
-    exe_path = dist_dir / exe_name
+    exe_path = executable_path(dist_dir, onedir)
     
-    if exe_path.exists():
+    if onedir and exe_path.exists():
+        shutil.copytree(exe_path.parent, package_dir, dirs_exist_ok=True)
+        print(f"Copied application folder to package")
+    elif exe_path.exists():
         shutil.copy2(exe_path, package_dir)
         print(f"Copied executable to package")
     
@@ -96,6 +179,10 @@ def create_distribution_package():
 4. Use the web interface to format and validate your Logstash pipeline files
 5. Click the "✕ Close Application" button in the top-right corner to exit
 
+Batch formatting without the web interface:
+
+    LogstashPipelineFormatter cli --write pipelines.d
+
 ## Features
 
 - ✅ Automatic syntax error detection and fixing
@@ -144,6 +231,15 @@ pause"""
     print(f"Zip file created: {zip_path}.zip")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Logstash Pipeline Formatter executable")
+    parser.add_argument("--onedir", action="store_true",
+                        help="Build a folder instead of a single file; starts faster")
+    parser.add_argument("--console", action="store_true",
+                        help="Keep the console window, needed for the cli mode on Windows")
+    parser.add_argument("--no-startup-check", action="store_true",
+                        help=f"Do not measure the startup time of the build (see {STARTUP_LOG})")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("    Logstash Pipeline Formatter - Build Script")
     print("=" * 60)
@@ -158,8 +254,10 @@ if __name__ == "__main__":
         print("PyInstaller installed")
     
     # Build executable
-    if build_executable():
-        create_distribution_package()
+    if build_executable(args.onedir, args.console):
+        if not args.no_startup_check:
+            measure_startup(args.onedir)
+        create_distribution_package(args.onedir)
         print("\nBuild process completed successfully!")
         print("Ready for distribution: LogstashPipelineFormatter_Portable.zip")
     else:
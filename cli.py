@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Command-line batch mode for the Logstash Pipeline Formatter.
+Formats every .conf file under the given paths on a pool of worker processes.
+
+    python cli.py pipelines.d            # report files that need formatting
+    python cli.py --write pipelines.d    # format the files in place
+    python cli.py --staged --changed-lines   # pre-commit: only the staged lines
+    python cli.py --routing --event-sample tags.json pipelines.d   # cost of the conditionals per event
+"""
+
+import argparse
+import difflib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.cache import DEFAULT_DISK_MAX_BYTES
+from utils.formatter import DISK_CACHE_ENV, MAX_LINE_LENGTH, check_pipeline_file, set_disk_cache
+from utils.git_changes import (
+    GitError, changed_files, changed_line_ranges, in_ranges, message_in_ranges, staged_content,
+)
+from utils.parser import ParseError, parse_cached
+from utils.pipeline_file import PipelineFile
+from utils.routing import analyze_routing, format_routing_report, load_event_sample
+
+PIPELINE_EXTENSION = ".conf"
+
+
+def find_pipeline_files(paths):
+    """Yield the .conf files in paths, walking directories recursively"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(PIPELINE_EXTENSION):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def is_warning(message):
+    return message.startswith("Warning:")
+
+
+def merge_changed_lines(original, formatted, line_ranges):
+    """
+    Takes the formatted output only where it replaces lines in line_ranges;
+    everywhere else the original lines are kept.
+
+    A block of replaced lines is split up line by line: the formatted lines
+    are spread evenly over the original lines they replace, so reindenting a
+    changed line does not also reindent the unchanged line next to it.
+    """
+    original_lines = original.split("\n")
+    formatted_lines = formatted.split("\n")
+    merged = []
+    matcher = difflib.SequenceMatcher(None, original_lines, formatted_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            merged.extend(original_lines[i1:i2])
+        elif tag == 'insert':
+            # Lines inserted by the formatter belong to the lines around them
+            if in_ranges(i1, line_ranges) or in_ranges(i1 + 1, line_ranges):
+                merged.extend(formatted_lines[j1:j2])
+        else:
+            count, replacements = i2 - i1, j2 - j1
+            for offset in range(count):
+                if in_ranges(i1 + offset + 1, line_ranges):
+                    # The formatted lines at the same relative position (none for a deleted line)
+                    start = j1 - (-offset * replacements // count)
+                    end = j1 - (-(offset + 1) * replacements // count)
+                    merged.extend(formatted_lines[start:end])
+                else:
+                    merged.append(original_lines[i1 + offset])
+    return "\n".join(merged)
+
+
+def process_file(path, write, max_length=MAX_LINE_LENGTH, validate=True, line_ranges=None, staged=False,
+                 structured=False):
+    """
+    Format one pipeline file (runs in a worker process); with structured
+    from its parse tree (see utils.formatter.format_structured).
+
+    With line_ranges (a list of (first, last) line numbers) only the errors
+    and fixes on those lines are reported and only those lines are changed.
+    With staged the version of the file in the git index is checked; it is
+    only written if the working tree has no other changes to the file.
+
+    Returns:
+        (path, changed, errors, fix_count) where changed tells whether the
+        formatted output differs from the file on disk (or in the index).
+    """
+    try:
+        data = staged_content(path) if staged else None
+    except GitError as e:
+        return path, False, [f"git: {e}"], 0
+    formatted, errors, fixes_applied = check_pipeline_file(path, max_length=max_length, validate=validate,
+                                                           data=data, structured=structured)
+    if formatted is None:
+        return path, False, errors, 0
+
+    # Files on disk end with a newline, the formatter output does not
+    output = formatted + "\n" if formatted else ""
+    with PipelineFile(path, data) as source:
+        if line_ranges is not None:
+            output = merge_changed_lines(source.text(), output, line_ranges)
+            errors = [message for message in errors if message_in_ranges(message, line_ranges)]
+            fixes_applied = [fix for fix in fixes_applied if in_ranges(fix.line, line_ranges)]
+        # Written back in the encoding and line endings the file already had
+        output_data = source.encode(output)
+        changed = not source.same_bytes(output_data)
+    if changed and write and staged:
+        with PipelineFile(path) as working_tree:
+            if not working_tree.same_bytes(data):
+                errors.append("The file has unstaged changes, so the staged version was checked but not written")
+                return path, False, errors, len(fixes_applied)
+    if changed and write:
+        with open(path, 'wb') as file:
+            file.write(output_data)
+    return path, changed, errors, len(fixes_applied)
+
+
+def run(paths, write=False, workers=None, strict=False, verbose=False, max_length=MAX_LINE_LENGTH, validate=True,
+        line_ranges=None, cache_dir=None, cache_size=DEFAULT_DISK_MAX_BYTES, staged=False, structured=False):
+    """
+    Format all pipeline files under paths and print the results as they complete.
+    line_ranges optionally maps each file to the line ranges passed to process_file;
+    with staged the versions of the files in the git index are formatted, with
+    structured they are formatted from their parse trees.
+    With cache_dir the workers share a persistent result cache of cache_size bytes.
+
+    Returns the process exit code: 1 if any file has errors (or, when only
+    checking, needs formatting), 0 otherwise.
+    """
+    files = list(find_pipeline_files(paths))
+    failed = 0
+    changed_count = 0
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=set_disk_cache,
+                             initargs=(cache_dir, cache_size)) as executor:
+        futures = [executor.submit(process_file, path, write, max_length, validate,
+                                   None if line_ranges is None else line_ranges.get(path, []), staged, structured)
+                   for path in files]
+        for future in as_completed(futures):
+            path, changed, errors, fix_count = future.result()
+            problems = [e for e in errors if strict or not is_warning(e)]
+            if changed:
+                changed_count += 1
+                status = "reformatted" if write else "would reformat"
+            else:
+                status = "OK"
+            if problems:
+                failed += 1
+                status = f"{len(problems)} error(s)" + ("" if status == "OK" else f", {status}")
+            if verbose or changed or problems:
+                print(f"{path}: {status}" + (f" ({fix_count} fixes)" if fix_count else ""), flush=True)
+            for message in problems:
+                print(f"    {message}", flush=True)
+
+    verb = "reformatted" if write else "would be reformatted"
+    print(f"\n{len(files)} file(s) checked, {changed_count} {verb}, {failed} with errors")
+    if failed or (changed_count and not write):
+        return 1
+    return 0
+
+
+def report_routing(paths, sample_path=None):
+    """
+    Print how many comparisons the conditionals of each pipeline file under
+    paths cost per event, with suggested branch orders (see utils.routing).
+
+    Returns the process exit code: 2 if the sample cannot be read, 1 if a
+    file cannot be parsed, 0 otherwise.
+    """
+    try:
+        sample = load_event_sample(sample_path) if sample_path else None
+    except (OSError, ValueError) as e:
+        print(f"{sample_path}: {e}", file=sys.stderr)
+        return 2
+    failed = 0
+    for path in find_pipeline_files(paths):
+        try:
+            with PipelineFile(path) as source:
+                config = parse_cached(source.text())
+        except (OSError, ParseError) as e:
+            failed += 1
+            print(f"{path}: {e}", flush=True)
+            continue
+        print(f"{path}:")
+        for line in format_routing_report(analyze_routing(config, sample)):
+            print(f"    {line}", flush=True)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Format Logstash pipeline (.conf) files")
+    parser.add_argument("paths", nargs="*",
+                        help="Pipeline files or directories to search for .conf files (with git options: to limit to)")
+    parser.add_argument("--write", action="store_true", help="Write the formatted output back to the files")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--strict", action="store_true", help="Also fail on warnings such as a missing output block")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Skip the checks of plugins and settings against the plugin schema")
+    parser.add_argument("--max-line-length", type=int, default=MAX_LINE_LENGTH,
+                        help=f"Wrap lines longer than this (default: {MAX_LINE_LENGTH})")
+    parser.add_argument("--structured", action="store_true",
+                        help="Format from the parse tree: the same layout for every plugin, hash and array "
+                             "(files that do not parse are formatted line by line)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Also list files that need no changes")
+    parser.add_argument("--cache-dir", default=os.environ.get(DISK_CACHE_ENV),
+                        help=f"Keep results in a cache in this directory, shared with other runs "
+                             f"(default: ${DISK_CACHE_ENV})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_DISK_MAX_BYTES // (1024 * 1024),
+                        help="Maximum size of the cache in MB")
+    git = parser.add_argument_group("git", "Only format the .conf files that changed in a git repository")
+    git.add_argument("--changed", action="store_true",
+                     help="Files changed in the working tree compared to HEAD, including untracked files")
+    git.add_argument("--staged", action="store_true", help="Files with staged changes, for a pre-commit hook")
+    git.add_argument("--since", metavar="REV",
+                     help="Files changed since a commit, or in a range such as origin/main...HEAD")
+    git.add_argument("--changed-lines", action="store_true",
+                     help="Only report errors and fixes on changed lines, and with --write only change those")
+    routing = parser.add_argument_group("routing", "Report the cost of the conditionals instead of formatting")
+    routing.add_argument("--routing", action="store_true",
+                         help="Estimate the comparisons per event of every if / else if chain "
+                              "and suggest faster orders")
+    routing.add_argument("--event-sample", metavar="FILE",
+                         help="Tag frequencies as a JSON object, or sample events as JSON or NDJSON "
+                              "(implies --routing)")
+    args = parser.parse_args(argv)
+    if args.max_line_length < 1:
+        parser.error("--max-line-length must be at least 1")
+    if args.routing or args.event_sample:
+        if not args.paths:
+            parser.error("--routing needs the pipeline files or directories to analyze")
+        return report_routing(args.paths, args.event_sample)
+    options = dict(write=args.write, workers=args.workers, strict=args.strict, verbose=args.verbose,
+                   max_length=args.max_line_length, validate=not args.no_validate, structured=args.structured,
+                   cache_dir=args.cache_dir, cache_size=args.cache_size * 1024 * 1024)
+
+    if not (args.changed or args.staged or args.since or args.changed_lines):
+        if not args.paths:
+            parser.error("no paths given (or use --changed, --staged or --since)")
+        return run(args.paths, **options)
+
+    try:
+        files, untracked = changed_files(PIPELINE_EXTENSION, args.since, args.staged, args.paths)
+        line_ranges = None
+        if args.changed_lines:
+            line_ranges = changed_line_ranges(args.since, args.staged, args.paths)
+            # Every line of a new file is changed
+            line_ranges.update(dict.fromkeys(untracked))
+    except GitError as e:
+        print(f"git: {e}", file=sys.stderr)
+        return 2
+    return run(files, line_ranges=line_ranges, staged=args.staged, **options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -306,10 +306,15 @@ def check_pipeline_file(file_path):
         tuple: (formatted_content, errors, fixes_applied)
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            formatted_content, errors, fixes_applied = format_logstash_pipeline(content)
-            return formatted_content, errors, fixes_applied
+        with open(file_path, 'rb') as file:
+            data = file.read()
+        # UTF-8 (met of zonder BOM), anders Windows-1252
+        try:
+            content = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            content = data.decode('cp1252', errors='replace')
+        formatted_content, errors, fixes_applied = format_logstash_pipeline(content)
+        return formatted_content, errors, fixes_applied
     except Exception as e:
         return None, [f"Fout bij lezen van bestand: {str(e)}"], []
 
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Entry point of the packaged executable.
+
+Only the modules the chosen mode needs are imported, so the headless CLI
+starts without loading Flask:
+
+    LogstashPipelineFormatter                      # desktop mode (see app.py)
+    LogstashPipelineFormatter serve --port 8000    # shared server (see app.py)
+    LogstashPipelineFormatter cli pipelines.d      # batch formatting (see cli.py)
+"""
+
+import time
+
+STARTED = time.perf_counter()
+
+import multiprocessing  # noqa: E402
+import sys  # noqa: E402
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "cli":
+        import cli
+        return cli.main(argv[1:])
+
+    import app
+    return app.main(argv, started=STARTED)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Needed for the process pools in the packaged executable
+    sys.exit(main())
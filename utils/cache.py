@@ -0,0 +1,342 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 256 * 1024 * 1024
+DISK_CACHE_FILE = "results.sqlite3"
+# Eviction removes entries until the store is this fraction of max_bytes, so it does not run on every put
+_EVICT_TO = 0.9
+# Seconds a process waits for another one that holds the database lock
+_LOCK_TIMEOUT = 30
+# Access times of hits are written in batches: at the next put, or once this many are pending or the
+# oldest has waited this many seconds, so a hit does not take the write lock
+_ACCESS_BATCH = 256
+_ACCESS_DELAY = 10
+_FIX_SIZE = 128
+# Approximate bytes of a parse tree per character of its source
+_TREE_SIZE_FACTOR = 13
+
+
+def content_hash(text):
+    """Returns the SHA-256 hex digest of a pipeline text."""
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _result_size(source_size, result):
+    """Approximate size of a cached entry in bytes (characters of all strings)."""
+    formatted, errors, fixes_applied = result
+    size = source_size + len(formatted or "")
+    for message in errors:
+        size += len(message)
+    # Fix records are only rendered when displayed; count a fixed size for each
+    size += _FIX_SIZE * len(fixes_applied)
+    return size
+
+
+def _copy_result(result):
+    # Callers may modify the returned lists, so never hand out the cached ones
+    formatted, errors, fixes_applied = result
+    return formatted, list(errors), list(fixes_applied)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache for formatter results.
+
+    Entries are keyed by the content hash of the pipeline text plus the
+    formatter options, and evicted least-recently-used first once either
+    max_entries or max_bytes is exceeded.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Returns a copy of the cached result for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy_result(entry[0])
+
+    def put(self, key, result, source_size=0):
+        """Stores result under key; source_size is the length of the formatted source."""
+        size = _result_size(source_size, result)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (_copy_result(result), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns the cache counters as a dict."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+class ParseCache:
+    """
+    Thread-safe LRU cache for parsed pipelines (see utils.parser), keyed by
+    content hash. A ParseError is cached like a tree and raised again on a hit.
+    Trees are shared between callers, so they must not be modified.
+
+    Like ResultCache it is bounded by max_entries and max_bytes; the size of
+    a tree is estimated from the length of its source.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # hash -> (tree, error, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_parse(self, text, parse_func):
+        key = content_hash(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is None:
+            size = len(text) * _TREE_SIZE_FACTOR
+            try:
+                entry = (parse_func(text), None, size)
+            except ValueError as e:
+                entry = (None, e, size)
+            if self.max_entries > 0 and size <= self.max_bytes:
+                with self._lock:
+                    old = self._entries.pop(key, None)
+                    if old is not None:
+                        self._bytes -= old[2]
+                    self._entries[key] = entry
+                    self._bytes += size
+                    while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                        _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                        self._bytes -= evicted_size
+
+        tree, error, _ = entry
+        if error is not None:
+            raise error
+        return tree
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns the cache counters as a dict."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'bytes': self._bytes}
+
+
+class DiskCache:
+    """
+    Persistent cache in an SQLite database, shared by CLI runs and server
+    processes.
+
+    Values are JSON-serializable objects, stored compressed under a string
+    key. Once the stored values exceed max_bytes, the least recently used
+    entries are removed. SQLite's locking (in WAL mode) makes it safe to use
+    from several processes at once; every process and thread opens its own
+    connection. Database errors are treated as misses, so a broken or busy
+    cache never stops formatting; only opening the cache raises them
+    (sqlite3.Error or OSError).
+
+    The total size of the values is kept in the one-row table meta, updated
+    in the transaction that changes the values. Hits only read: their access
+    times are collected and written in batches, so the least recently used
+    order is a little behind for entries read since the last batch.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_DISK_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, DISK_CACHE_FILE)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._accessed = {}  # key -> access time of the hits not written yet
+        self._accessed_since = None
+        self._accessed_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        connection = self._connection()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+                connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)")
+                # Stores made before the meta table get their total counted once
+                connection.execute(
+                    "INSERT OR IGNORE INTO meta (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM results")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            connection.close()
+            raise
+
+    def _connection(self):
+        # A connection must not be used in a forked child, so it is kept per process as well
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = sqlite3.connect(self.path, timeout=_LOCK_TIMEOUT, isolation_level=None)
+            local.connection.execute("PRAGMA synchronous=NORMAL")
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, key):
+        """Returns the value stored under key, or None."""
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value = json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, zlib.error, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(key)
+        return value
+
+    def _touch(self, key):
+        """Records the access time of a hit, and writes the pending ones once the batch is due."""
+        now = time.time()
+        with self._accessed_lock:
+            if not self._accessed:
+                self._accessed_since = now
+            self._accessed[key] = now
+            due = len(self._accessed) >= _ACCESS_BATCH or now - self._accessed_since >= _ACCESS_DELAY
+        if due:
+            try:
+                connection = self._connection()
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    self._write_accessed(connection)
+                    connection.execute("COMMIT")
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error:
+                pass
+
+    def _write_accessed(self, connection):
+        """Writes the pending access times in the open transaction of connection."""
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+        if accessed:
+            connection.executemany("UPDATE results SET accessed = ? WHERE key = ?",
+                                   [(when, key) for key, when in accessed.items()])
+
+    def put(self, key, value):
+        """Stores value under key and evicts the least recently used entries if needed."""
+        blob = zlib.compress(json.dumps(value).encode('utf-8', 'surrogatepass'), 1)
+        if len(blob) > self.max_bytes:
+            return
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_accessed(connection)
+                row = connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+                connection.execute("INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                                   (key, blob, len(blob), time.time()))
+                total = self._add_total(connection, len(blob) - (row[0] if row else 0))
+                if total > self.max_bytes:
+                    self._evict(connection, total - int(self.max_bytes * _EVICT_TO))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+    def _add_total(self, connection, change):
+        """Adds change to the running total of the value sizes and returns the new total."""
+        connection.execute("UPDATE meta SET total = total + ? WHERE id = 0", (change,))
+        return connection.execute("SELECT total FROM meta WHERE id = 0").fetchone()[0]
+
+    def _evict(self, connection, excess):
+        keys = []
+        removed = 0
+        for key, size in connection.execute("SELECT key, size FROM results ORDER BY accessed"):
+            keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        connection.executemany("DELETE FROM results WHERE key = ?", keys)
+        self._add_total(connection, -removed)
+
+    def clear(self):
+        with self._accessed_lock:
+            self._accessed = {}
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("DELETE FROM results")
+                connection.execute("UPDATE meta SET total = 0 WHERE id = 0")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        """Returns the counters of this process and the size of the store as a dict."""
+        try:
+            connection = self._connection()
+            entries = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            size = connection.execute("SELECT total FROM meta WHERE id = 0").fetchone()[0]
+        except sqlite3.Error:
+            entries, size = None, None
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size or 0}
@@ -0,0 +1,437 @@
+from functools import lru_cache
+
+from utils.parser import _NUMBER_RE, Conditional, _lex, walk
+
+# Parsed conditions kept per process; the same tag checks repeat across branches and pipelines
+CONDITION_CACHE_SIZE = 8192
+
+COMPARISON_OPERATORS = frozenset(['==', '!=', '<', '>', '<=', '>='])
+MATCH_OPERATORS = frozenset(['=~', '!~'])
+# Boolean operators from weakest to strongest binding; '!' binds tighter than all of them
+_BOOLEAN_LEVELS = (('or',), ('xor',), ('and', 'nand'))
+_KEYWORDS = frozenset(['and', 'or', 'xor', 'nand', 'in', 'not'])
+_SYMMETRIC_OPERATORS = frozenset(['==', '!='])
+
+
+class ConditionError(ValueError):
+    """Raised for the expression of an if / else if that Logstash would not accept."""
+
+
+class Expression:
+    """
+    Base class of parsed conditions.
+
+    key is a canonical text of the expression: two conditions with the same
+    key are the same test, whatever their spacing, quotes or operand order.
+    """
+
+    __slots__ = ('key',)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.key})"
+
+
+class Literal(Expression):
+    """A string (value without quotes) or number (value as float)."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+        if isinstance(value, str):
+            self.key = '"' + value + '"'
+        else:
+            self.key = str(int(value)) if value.is_integer() else str(value)
+
+
+class Field(Expression):
+    """A field reference like [@metadata][fingerprint]; path holds the names between the brackets."""
+
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = tuple(path)
+        self.key = "".join(f"[{name}]" for name in self.path)
+
+
+class List(Expression):
+    """A list of values, like ["a", "b"] on the right of 'in'."""
+
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+        self.key = "[" + ", ".join(item.key for item in items) + "]"
+
+
+class Regex(Expression):
+    """A /regular expression/; pattern is the text between the slashes."""
+
+    __slots__ = ('pattern',)
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.key = f"/{pattern}/"
+
+
+class Call(Expression):
+    """A method call like sprintf("%{x}") used as a value."""
+
+    __slots__ = ('name', 'args')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.key = f"{name}(" + ", ".join(arg.key for arg in args) + ")"
+
+
+class Not(Expression):
+    __slots__ = ('operand',)
+
+    def __init__(self, operand):
+        self.operand = operand
+        self.key = f"!({operand.key})"
+
+
+class Comparison(Expression):
+    """left op right, where op is a comparison, match, 'in' or 'not in' operator."""
+
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+        operands = (left.key, right.key)
+        if op in _SYMMETRIC_OPERATORS:
+            operands = sorted(operands)
+        self.key = f"{operands[0]} {op} {operands[1]}"
+
+
+class Boolean(Expression):
+    """
+    'and', 'or', 'xor' or 'nand' over operands, in source order. Chains of
+    'and' and of 'or' are flattened into one node.
+    """
+
+    __slots__ = ('op', 'operands')
+
+    def __init__(self, op, operands):
+        self.op = op
+        self.operands = operands
+        keys = [operand.key for operand in operands]
+        if op in ('and', 'or'):
+            keys = sorted(set(keys))
+        self.key = "(" + f" {op} ".join(keys) + ")"
+
+
+def _combine(op, left, right):
+    operands = []
+    for operand in (left, right):
+        if op in ('and', 'or') and isinstance(operand, Boolean) and operand.op == op:
+            operands.extend(operand.operands)
+        else:
+            operands.append(operand)
+    return Boolean(op, operands)
+
+
+class _ConditionParser:
+    """Recursive-descent parser over the tokens of utils.parser._lex."""
+
+    def __init__(self, text):
+        self.tokens = [(kind, value) for kind, value, _ in _lex(text) if kind != 'comment']
+        self.index = 0
+
+    def peek(self, ahead=0):
+        index = self.index + ahead
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self, what="a value"):
+        token = self.peek()
+        if token is None:
+            raise ConditionError(f"expected {what}, found end of condition")
+        self.index += 1
+        return token
+
+    def at(self, value, ahead=0):
+        token = self.peek(ahead)
+        return token is not None and token[1] == value and token[0] in ('op', 'punct', 'word')
+
+    def expect(self, value):
+        if not self.at(value):
+            token = self.peek()
+            found = "end of condition" if token is None else repr(token[1])
+            raise ConditionError(f"expected {value!r}, found {found}")
+        self.index += 1
+
+    def parse(self):
+        expression = self.boolean(0)
+        token = self.peek()
+        if token is not None:
+            raise ConditionError(f"unexpected {token[1]!r}")
+        return expression
+
+    def boolean(self, level):
+        if level == len(_BOOLEAN_LEVELS):
+            return self.expression()
+        left = self.boolean(level + 1)
+        while True:
+            token = self.peek()
+            if token is None or token[0] != 'word' or token[1] not in _BOOLEAN_LEVELS[level]:
+                return left
+            self.index += 1
+            left = _combine(token[1], left, self.boolean(level + 1))
+
+    def expression(self):
+        if self.at('('):
+            self.index += 1
+            group = self.boolean(0)
+            self.expect(')')
+            return group
+        if self.at('!'):
+            self.index += 1
+            if self.at('('):
+                return Not(self.expression())
+            if self.at('['):
+                return Not(self.value())
+            raise ConditionError("'!' must be followed by '(' or a field reference")
+
+        left = self.value()
+        token = self.peek()
+        if token is None:
+            return left
+        kind, op = token
+        if kind == 'op' and op in COMPARISON_OPERATORS:
+            self.index += 1
+            return Comparison(op, left, self.value())
+        if kind == 'op' and op in MATCH_OPERATORS:
+            self.index += 1
+            right = self.value()
+            if not isinstance(right, Regex) and not (isinstance(right, Literal) and isinstance(right.value, str)):
+                raise ConditionError(f"expected a /regular expression/ or string after {op!r}")
+            return Comparison(op, left, right)
+        if kind == 'word' and op == 'in':
+            self.index += 1
+            return Comparison('in', left, self.value())
+        if kind == 'word' and op == 'not' and self.at('in', 1):
+            self.index += 2
+            return Comparison('not in', left, self.value())
+        return left
+
+    def value(self):
+        kind, value = self.next()
+        if kind == 'string':
+            return Literal(value[1:-1])
+        if kind == 'regex':
+            return Regex(value[1:-1])
+        if kind == 'punct' and value == '[':
+            return self.bracket()
+        if kind == 'word' and value not in _KEYWORDS:
+            if _NUMBER_RE.match(value):
+                return Literal(float(value))
+            if self.at('('):
+                return self.call(value)
+            raise ConditionError(f"unexpected {value!r}; field names go between brackets, like [{value}]")
+        raise ConditionError(f"expected a value, found {value!r}")
+
+    def bracket(self):
+        """A field reference or a list, after its '['."""
+        token = self.peek()
+        if token is not None and (token[0] == 'string' or token[1] == ']' or
+                                  (token[0] == 'word' and _NUMBER_RE.match(token[1]))):
+            items = []
+            while not self.at(']'):
+                items.append(self.value())
+                if not self.at(']'):
+                    self.expect(',')
+            self.index += 1
+            return List(items)
+
+        path = [self.element()]
+        # Only directly adjacent brackets continue the path: [a][b]
+        while self.at('[') and (self.peek(1) or ('',))[0] == 'word':
+            self.index += 1
+            path.append(self.element())
+        return Field(path)
+
+    def element(self):
+        words = []
+        while not self.at(']'):
+            kind, value = self.next("']'")
+            if kind != 'word':
+                raise ConditionError(f"unexpected {value!r} in field reference")
+            words.append(value)
+        self.index += 1
+        if not words:
+            raise ConditionError("empty field reference '[]'")
+        return " ".join(words)
+
+    def call(self, name):
+        self.index += 1
+        args = []
+        while not self.at(')'):
+            args.append(self.value())
+            if not self.at(')'):
+                self.expect(',')
+        self.index += 1
+        return Call(name, args)
+
+
+@lru_cache(maxsize=CONDITION_CACHE_SIZE)
+def parse_condition(text):
+    """
+    Parses the expression of an if / else if, such as the text of a
+    utils.parser.Condition. 'and' and 'nand' bind tighter than 'xor', which
+    binds tighter than 'or'.
+
+    Results are cached by text; parsed expressions are shared between
+    callers and must not be modified.
+
+    Returns:
+        (expression, error): the Expression and None, or None and the error message.
+    """
+    try:
+        return _ConditionParser(text).parse(), None
+    except ConditionError as e:
+        return None, str(e)
+
+
+def constant_value(expression):
+    """
+    True or False if expression does not depend on the event, like
+    `"a" == "b"` or a bare string (which is always true), else None.
+    """
+    if isinstance(expression, (Literal, List)):
+        return True
+    if isinstance(expression, Not):
+        value = constant_value(expression.operand)
+        return None if value is None else not value
+    if isinstance(expression, Comparison):
+        return _constant_comparison(expression)
+    if isinstance(expression, Boolean):
+        values = [constant_value(operand) for operand in expression.operands]
+        if expression.op in ('and', 'nand'):
+            result = False if False in values else (True if None not in values else None)
+            return result if result is None or expression.op == 'and' else not result
+        if expression.op == 'or':
+            return True if True in values else (False if None not in values else None)
+        return None if None in values else values[0] != values[1]
+    return None
+
+
+def _constant_comparison(expression):
+    op, left, right = expression.op, expression.left, expression.right
+    if not isinstance(left, Literal) or not isinstance(right, (Literal, List, Regex)):
+        return None
+    if op in ('in', 'not in'):
+        if isinstance(right, List):
+            found = any(isinstance(item, Literal) and item.value == left.value for item in right.items)
+        elif isinstance(right, Literal) and isinstance(left.value, str) and isinstance(right.value, str):
+            found = left.value in right.value
+        else:
+            return None
+        return found if op == 'in' else not found
+    if op in MATCH_OPERATORS:
+        # Regular expressions come from the pipeline and may backtrack
+        # exponentially, so they are never run while checking it.
+        return None
+    if not isinstance(right, Literal) or type(left.value) is not type(right.value):
+        return None
+    if op == '==':
+        return left.value == right.value
+    if op == '!=':
+        return left.value != right.value
+    return {'<': left.value < right.value, '>': left.value > right.value,
+            '<=': left.value <= right.value, '>=': left.value >= right.value}[op]
+
+
+def _disjuncts(expression):
+    if isinstance(expression, Boolean) and expression.op == 'or':
+        return expression.operands
+    return [expression]
+
+
+def _conjuncts(expression):
+    if isinstance(expression, Boolean) and expression.op == 'and':
+        return frozenset(operand.key for operand in expression.operands)
+    return frozenset([expression.key])
+
+
+def covers(earlier, later):
+    """
+    True if every event that matches later also matches earlier, judged from
+    the terms of their 'or' and 'and' chains: `"a" in [tags]` covers
+    `"a" in [tags] and [type] == "x"`.
+    """
+    terms = [_conjuncts(disjunct) for disjunct in _disjuncts(earlier)]
+    return all(any(term <= _conjuncts(disjunct) for term in terms) for disjunct in _disjuncts(later))
+
+
+def _has_bare_literal(expression):
+    return isinstance(expression, Boolean) and expression.op == 'or' and \
+        any(isinstance(operand, Literal) for operand in expression.operands)
+
+
+def check_conditional(node):
+    """
+    Parses the conditions of an if / else if / else chain and looks for
+    branches that can never be taken.
+
+    Returns:
+        messages (list): Errors like 'Line N: ...' for conditions that do not
+            parse, and warnings for conditions that are always true or false
+            and for branches whose condition repeats or is covered by an
+            earlier one.
+    """
+    messages = []
+    earlier = []  # (expression, line) of the previous branches
+    always_true = None
+    for branch in node.branches:
+        if always_true is not None:
+            messages.append(f"Warning: Line {branch.line}: The {branch.kind} branch is never taken; "
+                            f"the condition on line {always_true} is always true")
+            break
+        condition = branch.condition
+        if condition is None:
+            break
+        expression, error = parse_condition(condition.text)
+        if error is not None:
+            messages.append(f"Line {condition.line}: Invalid condition '{condition.text}': {error}")
+            continue
+
+        constant = constant_value(expression)
+        if constant is True:
+            hint = "; a bare string after 'or' is always true, compare it with the field as well" \
+                if _has_bare_literal(expression) else ""
+            messages.append(f"Warning: Line {condition.line}: Condition '{condition.text}' is always true{hint}")
+            always_true = condition.line
+        elif constant is False:
+            messages.append(f"Warning: Line {condition.line}: Condition '{condition.text}' is always false; "
+                            f"the {branch.kind} branch is never taken")
+        else:
+            for previous, line in earlier:
+                if previous.key == expression.key:
+                    messages.append(f"Warning: Line {condition.line}: Condition '{condition.text}' repeats "
+                                    f"the one on line {line}; the {branch.kind} branch is never taken")
+                    break
+                if covers(previous, expression):
+                    messages.append(f"Warning: Line {condition.line}: The {branch.kind} branch is never taken; "
+                                    f"events matching '{condition.text}' already match the condition on line {line}")
+                    break
+        earlier.append((expression, condition.line))
+    return messages
+
+
+def check_conditions(config):
+    """
+    Runs check_conditional on every if / else if / else chain of a parsed
+    pipeline, including nested ones.
+
+    Returns:
+        messages (list): The messages of check_conditional, chain by chain.
+    """
+    messages = []
+    for node in walk(config):
+        if isinstance(node, Conditional):
+            messages.extend(check_conditional(node))
+    return messages
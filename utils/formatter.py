@@ -1,6 +1,623 @@
+import hashlib
+import io
+import logging
+import os
 import re
+import sqlite3
+import tempfile
+import time
+from functools import lru_cache, partial
 
-def format_logstash_pipeline(file_content):
+from utils import metrics
+from utils.cache import DEFAULT_DISK_MAX_BYTES, DiskCache, ResultCache, content_hash
+from utils.parser import ParseError, Section, parse_cached
+from utils.pipeline_file import EncodingChanged, PipelineFile
+from utils.printer import print_config
+from utils.tokenizer import (
+    ARROW, LBRACE, QUOTE, RBRACE, TEMPLATE, is_space, is_word_end, tokenize, tokenize_line, tokenize_lines,
+)
+from utils.validator import validate_config, validate_pipeline
+
+MAX_LINE_LENGTH = 100  # Pas deze waarde aan voor een andere maximale regelbreedte.
+# Formatted lines per 'lines' event of iter_pipeline_results
+STREAM_CHUNK_LINES = 1000
+
+# Shared by check_pipeline_text and check_pipeline_file, so repeated submissions are not reformatted
+result_cache = ResultCache()
+# Persistent cache behind result_cache, shared with other processes; see set_disk_cache
+disk_cache = None
+# Environment variable with the default directory of the disk cache for the CLI and the server
+DISK_CACHE_ENV = "LOGSTASH_FORMATTER_CACHE_DIR"
+# Files whose contents determine the results, so a new version does not use old cached results
+_VERSION_FILES = (
+    "formatter.py", "tokenizer.py", "pipeline_file.py", "parser.py", "validator.py", "grok.py",
+    "conditions.py", "printer.py", "logstash_plugins.json", "grok-patterns",
+)
+
+# All patterns used by the formatter, compiled once
+_MULTI_SPACE_RE = re.compile(r'  +')
+_LEADING_SPACE_RE = re.compile(r'(\s*)')
+_SECTIONS = ("input", "filter", "output")
+
+# Codes of the automatic fixes
+FIX_WHITESPACE = 'whitespace'
+FIX_SPLIT_BRACE = 'split_brace'
+FIX_QUOTED_VALUE = 'quoted_value'
+FIX_CLOSING_QUOTE = 'closing_quote'
+FIX_MISSING_BRACE = 'missing_brace'
+FIX_WRAPPED_LINE = 'wrapped_line'
+FIX_CLEANUP = 'cleanup'
+
+_FIX_MESSAGES = {
+    FIX_WHITESPACE: "Line {line}: Cleaned whitespace - was: '{before}' now: '{after}'",
+    FIX_SPLIT_BRACE: "Line {line}: Split closing brace and text into separate lines",
+    FIX_QUOTED_VALUE: "Line {line}: Added quotes around value - was: '{before}' now: '{after}'",
+    FIX_CLOSING_QUOTE: "Line {line}: Added missing closing quote",
+    FIX_MISSING_BRACE: "Line {line}: Added missing closing brace for the block opened on line {before}",
+    FIX_WRAPPED_LINE: "Wrapped long line into {after} lines",
+    FIX_CLEANUP: "Removed extra whitespace and empty lines",
+}
+
+# Fixes whose line number refers to the input (as opposed to the output)
+_INPUT_LINE_FIXES = frozenset([FIX_WHITESPACE, FIX_SPLIT_BRACE, FIX_QUOTED_VALUE, FIX_CLOSING_QUOTE])
+
+
+class Fix:
+    """
+    An automatic fix applied by the formatter.
+
+    Only the code, line number and the text involved are stored; the
+    message is rendered by str() when the fix is displayed.
+    """
+
+    __slots__ = ('code', 'line', 'before', 'after')
+
+    def __init__(self, code, line=None, before=None, after=None):
+        self.code = code
+        self.line = line
+        self.before = before
+        self.after = after
+
+    def __str__(self):
+        return _FIX_MESSAGES[self.code].format(line=self.line, before=self.before, after=self.after)
+
+    def __repr__(self):
+        return f"Fix({self.code!r}, line={self.line!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Fix):
+            return NotImplemented
+        return (self.code, self.line, self.before, self.after) == (other.code, other.line, other.before, other.after)
+
+    def __hash__(self):
+        return hash((self.code, self.line, self.before, self.after))
+
+    def shifted(self, offset):
+        """Returns this fix with its input line number moved by offset."""
+        if self.code not in _INPUT_LINE_FIXES:
+            return self
+        return Fix(self.code, self.line + offset, self.before, self.after)
+
+
+def _normalize_tokens(tokens):
+    """
+    Applies the whitespace rules to the tokens of one line.
+
+    • Strips leading and trailing whitespace.
+    • Puts exactly one space on each side of '=>'.
+    • Puts exactly one space before '{' (skipped on lines with %{...} templates).
+    • Collapses runs of spaces elsewhere to a single space.
+
+    Returns a new token list; joining it gives the cleaned line.
+    """
+    start = 0
+    end = len(tokens)
+    if end and is_space(tokens[0]):
+        start = 1
+    if end > start and is_space(tokens[end - 1]):
+        end -= 1
+    has_template = TEMPLATE in tokens
+
+    normalized = []
+    append = normalized.append
+    for index in range(start, end):
+        token = tokens[index]
+        if token == ' ':
+            if tokens[index - 1] != ARROW and tokens[index + 1] != ARROW:
+                append(token)
+        elif token == ARROW:
+            if not normalized or normalized[-1] != ' ':
+                append(' ')
+            append(ARROW)
+            append(' ')
+        elif token[0].isspace():
+            next_token = tokens[index + 1]
+            if tokens[index - 1] == ARROW or next_token == ARROW:
+                # The surrounding spaces are part of the ' => ' operator
+                continue
+            if next_token == LBRACE and not has_template:
+                append(' ')
+            elif '  ' in token:
+                append(_MULTI_SPACE_RE.sub(' ', token))
+            else:
+                append(token)
+        else:
+            if token == LBRACE and not has_template and normalized and is_word_end(normalized[-1]):
+                append(' ')
+            append(token)
+    return normalized
+
+
+def _unescaped_quotes(tokens):
+    """Counts the '"' tokens that are not preceded by a backslash."""
+    count = tokens.count(QUOTE)
+    if count and '\\' in ''.join(tokens):
+        for index in range(1, len(tokens)):
+            if tokens[index] == QUOTE and tokens[index - 1].endswith('\\'):
+                count -= 1
+    return count
+
+
+def _opens_section(tokens):
+    """True for the normalized tokens of a line like 'filter {' that opens a top-level section."""
+    if not tokens or tokens[0] not in _SECTIONS:
+        return False
+    rest = tokens[2:] if len(tokens) > 1 and is_space(tokens[1]) else tokens[1:]
+    return rest[:1] == [LBRACE]
+
+
+def _source_indent(raw_tokens):
+    """The width of the indentation of a tokenized line as written, with tabs counted as four spaces."""
+    if raw_tokens and is_space(raw_tokens[0]):
+        return len(raw_tokens[0].expandtabs(4))
+    return 0
+
+
+def _ended_blocks(blocks, source_indent, closing):
+    """
+    Returns the number of innermost blocks whose children end before a line
+    at source_indent: blocks opened on a line indented at least as deep
+    (deeper than a closing brace line, which closes the block it lines up
+    with). Only blocks whose children were indented deeper than the opening
+    line, and which are themselves indented deeper than their parent, count;
+    a block opened at depth 0 is left to the section and end-of-file checks.
+    """
+    ended = 0
+    for depth in range(len(blocks) - 1, 0, -1):
+        block_indent, nested = blocks[depth]
+        if block_indent is None or block_indent < source_indent or (closing and block_indent == source_indent):
+            break
+        parent_indent = blocks[depth - 1][0]
+        if nested and parent_indent is not None and parent_indent < block_indent:
+            ended = len(blocks) - depth
+    return ended
+
+
+def _close_block(blocks, source_indent, state):
+    """
+    Pops the innermost block for a closing brace. A leading closing brace
+    (source_indent is not None) that is not lined up with the opening line
+    makes the indentation unreliable for finding missing braces.
+    """
+    block_indent = blocks.pop()[0] if blocks else None
+    if source_indent is not None and block_indent is not None and state.indent_reliable is not False:
+        state.indent_reliable = block_indent == source_indent
+
+
+class _FormatState:
+    """Brace and quote state carried from line to line by _format_token_lines."""
+
+    __slots__ = (
+        'indent_level', 'brace_stack', 'blocks', 'indent_reliable', 'repaired', 'quote_toggles', 'quote_start_line',
+    )
+
+    def __init__(self, indent_level=0, blocks=None):
+        self.indent_level = indent_level
+        # stack holds the line numbers of unmatched '{' (0 for braces opened before this state)
+        self.brace_stack = [0] * indent_level
+        # [source indent of the opening line (None if unknown), whether a child line was indented deeper]
+        # for each entry of brace_stack
+        self.blocks = [list(block) for block in blocks] if blocks else [[None, False] for _ in range(indent_level)]
+        # Whether the leading closing braces so far were lined up with their opening lines (None: none seen yet)
+        self.indent_reliable = None
+        self.repaired = False  # a block was closed because the indentation showed its children ended
+        self.quote_toggles = 0  # number of lines with an odd number of quotes
+        self.quote_start_line = None  # the last of those lines
+
+    def quote_errors(self):
+        """Returns the error for a multi-line quote block that is never closed."""
+        # Only add closing quote if it's truly missing across multiple lines
+        # Don't auto-fix multi-line quotes as it's complex to determine where they should close
+        if self.quote_toggles % 2 != 0 and self.quote_start_line:
+            return [f"Line {self.quote_start_line}: Multi-line quote block missing closing quote"]
+        return []
+
+
+def _format_token_lines(token_lines, errors, fixes_applied, state):
+    """
+    Re-indents and auto-fixes tokenized lines, yielding the formatted lines.
+
+    Extra closing braces are added to errors. The brace stack, indent level
+    and quote state are updated in state (an _FormatState).
+    """
+    indent_level = state.indent_level
+    brace_stack = state.brace_stack
+    blocks = state.blocks
+    quote_toggles = state.quote_toggles
+    quote_start_line = state.quote_start_line
+    record = fixes_applied is not None
+
+    for line_number, raw_tokens in token_lines:
+        # Strip spaces and insert a space before '{' if missing, but preserve template variables like %{...}
+        tokens = _normalize_tokens(raw_tokens)
+        trimmed = ''.join(tokens)
+
+        if record:
+            stripped = ''.join(raw_tokens).strip()
+            if trimmed != stripped and stripped:
+                fixes_applied.append(Fix(FIX_WHITESPACE, line_number, stripped, trimmed))
+
+        # Count leading closing braces to adjust indent.
+        leader = 0
+        for token in tokens:
+            if token != RBRACE:
+                break
+            leader += 1
+
+        # A top-level section can only start at depth 0, so the blocks still open end before it
+        if not leader and brace_stack and quote_toggles % 2 == 0 and _opens_section(tokens):
+            for open_line in brace_stack:
+                errors.append(f"Line {open_line}: Missing closing brace '}}' - attempting auto-fix.")
+            yield from _closing_brace_lines(brace_stack, fixes_applied)
+            brace_stack.clear()
+            blocks.clear()
+            indent_level = 0
+
+        # A line indented no deeper than the opening line of a block ends that block's children;
+        # blocks still open there are missing their closing brace, which goes before the line
+        source_indent = None
+        if tokens and quote_toggles % 2 == 0 and not tokens[0].startswith('#'):
+            source_indent = _source_indent(raw_tokens)
+            # A closing brace only ends inner blocks once earlier closing braces showed that they line up
+            if len(blocks) > 1 and (state.indent_reliable if leader else state.indent_reliable is not False):
+                ended = _ended_blocks(blocks, source_indent, leader > 0)
+                if ended:
+                    for open_line in brace_stack[-ended:]:
+                        errors.append(f"Line {open_line}: Missing closing brace '}}' - attempting auto-fix.")
+                    yield from _closing_brace_lines(brace_stack[-ended:], fixes_applied, len(brace_stack) - ended)
+                    del brace_stack[-ended:]
+                    del blocks[-ended:]
+                    indent_level -= ended
+                    state.repaired = True
+            if blocks and blocks[-1][0] is not None and source_indent > blocks[-1][0]:
+                blocks[-1][1] = True
+
+        # Auto-fix for braces followed by text (like "}tcp {")
+        # This should split into separate lines: "}" and "tcp {"
+        if leader:
+            text_start = leader
+            if text_start < len(tokens) and is_space(tokens[text_start]):
+                text_start += 1
+            if text_start < len(tokens) and is_word_end(tokens[text_start][0]) and \
+               (LBRACE in tokens[text_start + 1:] or TEMPLATE in tokens[text_start + 1:]):
+                if record:
+                    fixes_applied.append(Fix(FIX_SPLIT_BRACE, line_number))
+
+                # Process the closing brace line first
+                temp_indent = max(indent_level - leader, 0)
+                yield f"{temp_indent * '    '}{'}' * leader}"
+
+                # Update indent level for closing braces
+                for _ in range(leader):
+                    if brace_stack:
+                        brace_stack.pop()
+                        _close_block(blocks, source_indent, state)
+                        indent_level -= 1
+                    else:
+                        errors.append(f"Line {line_number}: Extra closing brace '}}' found.")
+
+                # Now process the text line
+                tokens = tokens[text_start:]
+                trimmed = ''.join(tokens)
+                leader = 0
+
+        # Auto-fix common issues
+        if ARROW in tokens:
+            # Fix missing quotes around values (but skip single quotes - they're valid)
+            arrow_index = tokens.index(ARROW)
+            key_part = ''.join(tokens[:arrow_index]).strip()
+            value_part = ''.join(tokens[arrow_index + 1:]).strip()
+
+            # Skip values that already have quotes, arrays, numbers, booleans, template variables,
+            # and configuration blocks (like "codec => line {")
+            # Also skip values that end with } as they might be part of syntax like "nested => true }"
+            if not ('"' in value_part or "'" in value_part) and \
+               not (value_part.startswith('[') and value_part.endswith(']')) and \
+               not value_part.isdigit() and value_part not in ['true', 'false'] and \
+               not value_part.startswith('{') and not value_part.endswith('{') and \
+               not value_part.endswith('}') and \
+               not '%{' in value_part and \
+               (' ' in value_part or '-' in value_part or '.' in value_part):
+                original_value = value_part
+                value_part = f'"{value_part}"'
+                trimmed = f"{key_part} => {value_part}"
+                tokens = _normalize_tokens(tokenize_line(trimmed))
+                if record:
+                    fixes_applied.append(Fix(FIX_QUOTED_VALUE, line_number, original_value, value_part))
+
+            # Fix missing closing quotes for specific patterns (like => "value)
+            if QUOTE in tokens:
+                last_quote = len(tokens) - 1 - tokens[::-1].index(QUOTE)
+                # After normalization an opening quote right after the operator reads '=>', ' ', '"'
+                if last_quote >= 2 and tokens[last_quote - 2] == ARROW:
+                    tokens.append(QUOTE)
+                    trimmed += '"'
+                    if record:
+                        fixes_applied.append(Fix(FIX_CLOSING_QUOTE, line_number))
+
+        # Track quote state for cross-line quote detection (keep existing logic for complex cases)
+        if QUOTE in tokens and _unescaped_quotes(tokens) % 2 != 0:
+            quote_toggles += 1
+            quote_start_line = line_number
+
+        temp_indent = max(indent_level - leader, 0)
+        yield f"{temp_indent * '    '}{trimmed}"
+
+        # Track the braces of the line in order.
+        if '{' in trimmed or '}' in trimmed:
+            for index, token in enumerate(tokens):
+                if token == LBRACE or token == TEMPLATE:
+                    brace_stack.append(line_number)
+                    blocks.append([source_indent, False])
+                    indent_level += 1
+                elif token == RBRACE:
+                    if brace_stack:
+                        brace_stack.pop()
+                        _close_block(blocks, source_indent if index < leader else None, state)
+                        indent_level -= 1
+                    else:
+                        errors.append(f"Line {line_number}: Extra closing brace '}}' found.")
+
+    state.indent_level = indent_level
+    state.quote_toggles = quote_toggles
+    state.quote_start_line = quote_start_line
+
+
+class _InsertedBrace(str):
+    """
+    A closing brace line added by the formatter. Its fix names the output
+    line, which is only known after wrapping and whitespace cleanup, so
+    _clean_whitespace records the fix when it emits the line.
+    """
+
+    def record(self, line_number):
+        if self.fixes is not None:
+            self.fix.line = line_number
+            self.fixes.append(self.fix)
+
+
+def _closing_brace_lines(brace_stack, fixes_applied, depth=0):
+    """
+    Yields one closing brace line for each unmatched '{' in brace_stack,
+    innermost block first, each indented to the depth of its block; the
+    first entry of brace_stack is at the given depth.
+    """
+    for index in range(len(brace_stack) - 1, -1, -1):
+        line = _InsertedBrace(f"{(depth + index) * '    '}}}")
+        line.fix = Fix(FIX_MISSING_BRACE, None, brace_stack[index])
+        line.fixes = fixes_applied
+        yield line
+
+
+def _break_points(line, start):
+    """
+    Returns the indexes in line (from start) where it may be wrapped: spaces
+    outside quoted strings (double or single quotes), %{...} templates and
+    comments. Escaped characters (a backslash and the character after it)
+    never start or end a string.
+    """
+    points = []
+    quote = None  # the quote character of the string the index is in
+    template_depth = 0
+    index = start
+    length = len(line)
+    while index < length:
+        char = line[index]
+        if char == '\\':
+            index += 2
+            continue
+        if quote:
+            if char == quote:
+                quote = None
+        elif char == '"' or char == "'":
+            quote = char
+        elif char == '#' and not template_depth:
+            # A continuation line would no longer be part of the comment
+            break
+        else:
+            if char == ' ':
+                if not template_depth:
+                    points.append(index)
+            elif char == '%' and line.startswith('{', index + 1):
+                template_depth += 1
+                index += 1
+            elif char == '}' and template_depth:
+                template_depth -= 1
+        index += 1
+    return points
+
+
+# Voeg automatische regelomloop toe voor lange regels
+def _wrap_line(line, max_length):
+    """
+    Wraps line into lines of at most max_length characters where possible.
+
+    Continuation lines are indented one level deeper than line. Lines are only
+    broken at the spaces given by _break_points, so a part without such a
+    space (a long string, for example) is kept whole on a line of its own.
+    Runs in linear time in the length of line.
+    """
+    if len(line) <= max_length:
+        return [line]
+    # Bepaal de oorspronkelijke inspringing
+    indent = _LEADING_SPACE_RE.match(line).group(1)
+    continuation = indent + "    "
+    points = _break_points(line, len(indent))
+
+    wrapped = []
+    prefix = ""
+    start = 0
+    point = 0
+    while True:
+        # Room left for the text of this line, counted from start
+        room = max_length - len(prefix)
+        if len(line) - start <= room:
+            break
+        split_index = -1
+        while point < len(points) and points[point] - start <= room:
+            if points[point] > start:
+                split_index = points[point]
+            point += 1
+        if split_index < 0:
+            # No break point in reach: end the line at the next one instead
+            while point < len(points) and points[point] <= start:
+                point += 1
+            if point == len(points):
+                break
+            split_index = points[point]
+            point += 1
+        wrapped.append(prefix + line[start:split_index])
+        prefix = continuation
+        start = split_index
+        while start < len(line) and line[start] == ' ':
+            start += 1
+        if start == len(line):
+            return wrapped
+    wrapped.append(prefix + line[start:])
+    return wrapped
+
+
+def _wrap_lines(lines, fixes_applied, max_length=MAX_LINE_LENGTH):
+    """Yields the lines, wrapping those longer than max_length."""
+    for line in lines:
+        if len(line) > max_length:
+            wrapped = _wrap_line(line, max_length)
+            if len(wrapped) == 1:
+                yield line
+                continue
+            yield from wrapped
+            if fixes_applied is not None:
+                fixes_applied.append(Fix(FIX_WRAPPED_LINE, after=len(wrapped)))
+        else:
+            yield line
+
+
+def _clean_whitespace(lines, fixes_applied, found_sections=None):
+    """
+    Removes trailing whitespace and empty lines, yielding the cleaned lines.
+
+    Empty lines are only kept (once) between top-level blocks. Needs one line
+    of lookahead, so it can be used on a stream. If found_sections is given,
+    the top-level sections opened by the cleaned lines are added to it.
+    """
+    changed = False
+    line_count = 0
+    emitted = 0
+    previous_line = ""
+    last_cleaned = None
+    pending = None
+    section_state = [None] if found_sections is not None else None
+    for next_raw in lines:
+        line_count += 1
+        if pending is not None:
+            result = _clean_line(pending, previous_line, next_raw.strip(), last_cleaned)
+            changed = changed or result != pending
+            if result is not None:
+                last_cleaned = result
+                if section_state is not None and result:
+                    _track_section(result, found_sections, section_state)
+                emitted += 1
+                if isinstance(pending, _InsertedBrace):
+                    pending.record(emitted)
+                yield result
+            previous_line = pending.rstrip()
+        pending = next_raw
+    if pending is not None:
+        result = _clean_line(pending, previous_line, "", last_cleaned)
+        changed = changed or result != pending
+        if result is not None:
+            if section_state is not None and result:
+                _track_section(result, found_sections, section_state)
+            if isinstance(pending, _InsertedBrace):
+                pending.record(emitted + 1)
+            yield result
+
+    # A document that is a single empty line is empty both before and after
+    if changed and not (line_count == 1 and pending == "") and fixes_applied is not None:
+        fixes_applied.append(Fix(FIX_CLEANUP))
+
+
+def _clean_line(line, prev_line, next_line, last_cleaned):
+    """Cleans one line for _clean_whitespace; returns None if the line is dropped."""
+    # Remove trailing whitespace from all lines
+    cleaned_line = line.rstrip()
+    if cleaned_line != "":
+        return cleaned_line
+
+    # Skip empty line if it's just before a closing brace
+    if next_line.startswith("}"):
+        return None
+
+    # Skip empty line if it's just after an opening brace
+    if prev_line.endswith("{"):
+        return None
+
+    # Only keep empty lines between top-level blocks (input, filter, output)
+    if (prev_line.startswith("}") and
+            (next_line.startswith("input") or next_line.startswith("filter") or next_line.startswith("output"))):
+        # Keep one empty line between top-level blocks
+        if last_cleaned != "":
+            return cleaned_line
+    return None
+
+
+def _track_section(line, found_sections, section_state):
+    """
+    Records in found_sections the top-level section (input, filter, output)
+    that a non-empty cleaned line opens, like a multi-line '^\\s*input\\s*\\{'
+    search. section_state[0] holds a section name whose '{' may follow on the next line.
+    """
+    content = line.lstrip()
+    pending = section_state[0]
+    if pending is not None:
+        if content[0] == "{":
+            found_sections.add(pending)
+        section_state[0] = None
+    if content[0] in "ifo":
+        for section in _SECTIONS:
+            if content.startswith(section):
+                rest = content[len(section):].lstrip()
+                if rest.startswith("{"):
+                    found_sections.add(section)
+                elif not rest:
+                    section_state[0] = section
+                break
+
+
+def _section_warnings(found_sections):
+    """Returns the warnings for missing top-level sections."""
+    # Extra pipeline validation based on expected Kibana .conf syntax
+    warnings = []
+    if "input" not in found_sections:
+        warnings.append("Warning: No input block found. Pipeline may be missing essential configuration as per https://logstash-kafka.readthedocs.io/en/stable/configuration/")
+    if "output" not in found_sections:
+        warnings.append("Warning: No output block found. Pipeline may be missing essential configuration as per https://logstash-kafka.readthedocs.io/en/stable/configuration/")
+    if "filter" not in found_sections:
+        warnings.append("Warning: No filter block found. Consider adding filters for processing events as per https://www.elastic.co/docs/reference/logstash/config-examples")
+    return warnings
+
+
+def format_logstash_pipeline(file_content, diagnostics=True, max_length=MAX_LINE_LENGTH):
     """
     Processes a Logstash pipeline configuration string.
     
@@ -8,308 +625,393 @@ def format_logstash_pipeline(file_content):
     • Inserts a space before an opening brace if missing.
     • Checks for extra or missing closing braces, reporting errors with line numbers.
     • Automatically fixes common syntax errors where possible.
+
+    With diagnostics=False no fixes are recorded and the section checks are
+    skipped; use it when only the formatted text is needed. Lines longer than
+    max_length are wrapped.
     
     Returns:
         formatted (str): The re-indented configuration (without injected line numbers).
         errors (list): List of error messages with line numbers.
-        fixes_applied (list): List of automatic fixes that were applied.
+        fixes_applied (list): List of automatic fixes (Fix records, str() gives the message).
     """
-    lines = file_content.splitlines()
-    formatted_lines = []
     errors = []
-    fixes_applied = []
-    indent_level = 0
-    brace_stack = []  # stack holds the line numbers of unmatched '{'
-    quote_state = False
-    quote_start_line = None
+    state = _FormatState()
+    if diagnostics:
+        # Collected separately so fixes are listed per stage, as the stages used to run one after the other
+        line_fixes, wrap_fixes, cleanup_fixes, found_sections = [], [], [], set()
+    else:
+        line_fixes = wrap_fixes = cleanup_fixes = found_sections = None
 
-    for line_number, line in enumerate(lines, start=1):
-        original_line = line
-        # Strip spaces and insert a space before '{' if missing, but preserve template variables like %{...}
-        trimmed = line.strip()
-        
-        # Clean up excessive whitespace before opening braces (but not in template variables)
-        if not '%{' in trimmed:
-            # Replace multiple spaces before { with single space
-            trimmed = re.sub(r'\s+\{', r' {', trimmed)
-            # Ensure there's exactly one space before { for block definitions
-            trimmed = re.sub(r'(\w)\{', r'\1 {', trimmed)
-        
-        # Clean up excessive whitespace around => operators
-        if '=>' in trimmed:
-            # Normalize spaces around => operator
-            trimmed = re.sub(r'\s*=>\s*', ' => ', trimmed)
-        
-        # Clean up multiple consecutive spaces (but preserve indentation at start)
-        # Only clean internal whitespace, not leading whitespace
-        if trimmed:
-            # Split on first non-space character to preserve leading indentation
-            parts = re.split(r'(\S.*)', trimmed, 1)
-            if len(parts) > 1 and parts[1]:
-                # Clean up multiple spaces in the content part
-                cleaned_content = re.sub(r'  +', ' ', parts[1])
-                trimmed = parts[0] + cleaned_content
-        
-        if trimmed != line.strip() and line.strip():
-            fixes_applied.append(f"Line {line_number}: Cleaned whitespace - was: '{line.strip()}' now: '{trimmed}'")
-        
-        # Auto-fix for braces followed by text (like "}tcp {")
-        # This should split into separate lines: "}" and "tcp {"
-        brace_text_pattern = r'^(\}+)(\s*)(\w+.*\{.*)$'
-        match = re.match(brace_text_pattern, trimmed)
-        if match:
-            closing_braces = match.group(1)
-            whitespace = match.group(2)
-            remaining_text = match.group(3)
-            
-            # Create two separate lines
-            # First line: just the closing braces
-            brace_line = closing_braces
-            
-            # Second line: the remaining text with proper indentation
-            text_line = remaining_text
-            
-            fixes_applied.append(f"Line {line_number}: Split closing brace and text into separate lines")
-            
-            # Process the closing brace line first
-            leader = len(closing_braces)
-            temp_indent = max(indent_level - leader, 0)
-            formatted_line = f"{temp_indent * '    '}{brace_line}"
-            formatted_lines.append(formatted_line)
-            
-            # Update indent level for closing braces
-            for _ in range(leader):
-                if brace_stack:
-                    brace_stack.pop()
-                    indent_level -= 1
-                else:
-                    errors.append(f"Line {line_number}: Extra closing brace '}}' found.")
-            
-            # Now process the text line
-            trimmed = text_line
-            # Add space before { if missing
-            if not '%{' in trimmed:
-                trimmed = re.sub(r'(\w)\{', r'\1 {', trimmed)
-        
-        # Auto-fix common issues
-        # Fix missing quotes around values (but skip single quotes - they're valid)
-        if '=>' in trimmed:
-            # Look for unquoted values that should be quoted
-            parts = trimmed.split('=>', 1)
-            if len(parts) == 2:
-                key_part = parts[0].strip()
-                value_part = parts[1].strip()
-                
-                # Skip values that already have quotes, arrays, numbers, booleans, template variables,
-                # and configuration blocks (like "codec => line {")
-                # Also skip values that end with } as they might be part of syntax like "nested => true }"
-                if not ('"' in value_part or "'" in value_part) and \
-                   not (value_part.startswith('[') and value_part.endswith(']')) and \
-                   not value_part.isdigit() and value_part not in ['true', 'false'] and \
-                   not value_part.startswith('{') and not value_part.endswith('{') and \
-                   not value_part.endswith('}') and \
-                   not '%{' in value_part and \
-                   (' ' in value_part or '-' in value_part or '.' in value_part):
-                    # Don't quote template variables like %{...} or config blocks like "line {"
-                    if not (value_part.startswith('%{') and value_part.endswith('}')):
-                        original_value = value_part
-                        value_part = f'"{value_part}"'
-                        trimmed = f"{key_part} => {value_part}"
-                        fixes_applied.append(f"Line {line_number}: Added quotes around value - was: '{original_value}' now: '{value_part}'")
-        
-        # Fix missing closing quotes for specific patterns (like => "value)
-        if '=>' in trimmed and '"' in trimmed:
-            # Check for missing closing quote pattern: => "value without closing quote
-            if re.search(r'=>\s*"[^"]*$', trimmed):
-                trimmed += '"'
-                fixes_applied.append(f"Line {line_number}: Added missing closing quote")
-        
-        # Track quote state for cross-line quote detection (keep existing logic for complex cases)
-        quote_count = 0
-        i = 0
-        while i < len(trimmed):
-            if trimmed[i] == '"' and (i == 0 or trimmed[i-1] != '\\'):
-                quote_count += 1
-            i += 1
-        
-        if quote_count % 2 != 0:
-            if not quote_state:
-                quote_state = True
-                quote_start_line = line_number
-            else:
-                quote_state = False
-                quote_start_line = None
-        
-        # Count leading closing braces to adjust indent.
-        leader = 0
-        for char in trimmed:
-            if char == '}':
-                leader += 1
-            else:
-                break
-        temp_indent = max(indent_level - leader, 0)
-        formatted_line = f"{temp_indent * '    '}{trimmed}"
-        formatted_lines.append(formatted_line)
-        
-        # Process the leading closing braces.
-        i = 0
-        while i < len(trimmed) and trimmed[i] == '}':
-            if brace_stack:
-                brace_stack.pop()
-                indent_level -= 1
-            else:
-                errors.append(f"Line {line_number}: Extra closing brace '}}' found.")
-            i += 1
-        
-        # Process the rest of the line.
-        for char in trimmed[i:]:
-            if char == '{':
-                brace_stack.append(line_number)
-                indent_level += 1
-            elif char == '}':
-                if brace_stack:
-                    brace_stack.pop()
-                    indent_level -= 1
-                else:
-                    errors.append(f"Line {line_number}: Extra closing brace '}}' found.")
-    
-    # Handle missing closing quotes by adding them (but only for multi-line quote blocks)
-    if quote_state and quote_start_line:
-        # Only add closing quote if it's truly missing across multiple lines
-        errors.append(f"Line {quote_start_line}: Multi-line quote block missing closing quote")
-        # Don't auto-fix multi-line quotes as it's complex to determine where they should close
-    
-    # Handle missing closing braces - add them to the appropriate lines
-    missing_braces = len(brace_stack)
-    if missing_braces > 0:
-        for open_line in brace_stack:
-            errors.append(f"Line {open_line}: Missing closing brace '}}' - attempting auto-fix.")
-        
-        # For each missing brace, find the appropriate place to add it
-        for j in range(missing_braces):
-            # Work backwards to find a suitable line for this brace
-            for i in range(len(formatted_lines) - 1, -1, -1):
-                line_content = formatted_lines[i].strip()
-                if line_content and not line_content.endswith('{') and not line_content.endswith('}'):
-                    # Add ONE closing brace to this line
-                    formatted_lines[i] += "}"
-                    fixes_applied.append(f"Added missing closing brace to line {i+1}")
-                    break
-            else:
-                # If no suitable line found, add as new line
-                formatted_lines.append("}")
-                fixes_applied.append("Added missing closing brace as new line")
-
-    # Voeg automatische regelomloop toe voor lange regels
-    def wrap_line(line, max_length):
-        if len(line) <= max_length:
-            return [line]
-        # Bepaal de oorspronkelijke inspringing
-        m = re.match(r'(\s*)', line)
-        indent = m.group(1) if m else ""
-        in_quote = False
-        last_space = -1
-        for i, ch in enumerate(line):
-            if i > max_length:
-                break
-            if ch == '"' and (i == 0 or line[i-1] != '\\'):
-                in_quote = not in_quote
-            if ch == ' ' and not in_quote:
-                last_space = i
-        split_index = last_space if last_space > len(indent) else max_length
-        first_part = line[:split_index]
-        rest = line[split_index:].lstrip()
-        wrapped = [first_part]
-        if rest:
-            # Voeg extra inspringing toe voor het vervolg
-            wrapped += wrap_line(indent + "    " + rest, max_length)
-        return wrapped
-
-    new_formatted_lines = []
-    max_length = 100  # Pas deze waarde aan voor een andere maximale regelbreedte.
+    # One pass: every stage is a generator that handles a line as soon as the previous stage yields it
+    timer = metrics.PhaseTimer() if metrics.phase_observer is not None else None
+    token_lines = _timed(timer, 'tokenize', tokenize(file_content))
+    formatted_lines = _timed(timer, 'format_lines', _format_token_lines(token_lines, errors, line_fixes, state))
+    repaired_lines = _timed(timer, 'repair', _close_open_blocks(formatted_lines, state, errors, line_fixes))
+    wrapped_lines = _timed(timer, 'wrap', _wrap_lines(repaired_lines, wrap_fixes, max_length))
+    formatted = "\n".join(_timed(timer, 'cleanup', _clean_whitespace(wrapped_lines, cleanup_fixes, found_sections)))
+    if timer is not None:
+        timer.report(metrics.phase_observer)
+    if not diagnostics:
+        return formatted, [], []
+
+    errors.extend(_section_warnings(found_sections))
+    return formatted, errors, line_fixes + wrap_fixes + cleanup_fixes
+
+
+def _timed(timer, phase, lines):
+    """Wraps a stage for utils.metrics phase timing; without a timer the stage is used as is."""
+    return lines if timer is None else timer.wrap(phase, lines)
+
+
+def _finish_output(wrapped_lines, errors, fixes_applied):
+    """Cleans whitespace, validates the top-level sections and returns the formatted text."""
+    found_sections = set()
+    formatted = "\n".join(_clean_whitespace(wrapped_lines, fixes_applied, found_sections))
+    errors.extend(_section_warnings(found_sections))
+    return formatted
+
+
+def _close_open_blocks(formatted_lines, state, errors, fixes_applied):
+    """
+    Passes formatted lines through and closes the blocks that are still open
+    at the end (blocks left open before a top-level section are already
+    closed there by _format_token_lines). Only a run of empty lines is held
+    back, because the closing braces go before the empty lines that precede
+    them.
+    """
+    held = []
     for line in formatted_lines:
-        if len(line) > max_length:
-            wrapped = wrap_line(line, max_length)
-            new_formatted_lines.extend(wrapped)
-            if len(wrapped) > 1:
-                fixes_applied.append(f"Wrapped long line into {len(wrapped)} lines")
+        if isinstance(line, _InsertedBrace):
+            # Braces closed before a section go before the empty lines as well
+            yield line
+        elif line and not line.isspace():
+            yield from held
+            held.clear()
+            yield line
         else:
-            new_formatted_lines.append(line)
-    formatted = "\n".join(new_formatted_lines)
-
-    # Clean up extra whitespace and empty lines
-    def clean_whitespace(text):
-        lines = text.splitlines()
-        cleaned_lines = []
-        
-        for i, line in enumerate(lines):
-            # Remove trailing whitespace from all lines
-            cleaned_line = line.rstrip()
-            
-            # Handle empty lines
-            if cleaned_line == "":
-                # Get context lines
-                prev_line = lines[i-1].rstrip() if i > 0 else ""
-                next_line = lines[i+1].strip() if i < len(lines) - 1 else ""
-                
-                # Skip empty line if it's just before a closing brace
-                if next_line.startswith("}"):
-                    continue
-                
-                # Skip empty line if it's just after an opening brace
-                if prev_line.endswith("{"):
-                    continue
-                
-                # Only keep empty lines between top-level blocks (input, filter, output)
-                if (prev_line.startswith("}") and 
-                    (next_line.startswith("input") or next_line.startswith("filter") or next_line.startswith("output"))):
-                    # Keep one empty line between top-level blocks
-                    if not (cleaned_lines and cleaned_lines[-1] == ""):
-                        cleaned_lines.append(cleaned_line)
-                    continue
-                
-                # Skip all other empty lines
-                continue
-                    
-            cleaned_lines.append(cleaned_line)
-        
-        # Remove trailing empty lines
-        while cleaned_lines and cleaned_lines[-1] == "":
-            cleaned_lines.pop()
-            
-        return "\n".join(cleaned_lines)
-    
-    original_formatted = formatted
-    formatted = clean_whitespace(formatted)
-    
-    # Track if whitespace cleanup was applied
-    if original_formatted != formatted:
-        fixes_applied.append("Removed extra whitespace and empty lines")
+            held.append(line)
 
-    # Extra pipeline validation based on expected Kibana .conf syntax
-    if not re.search(r'^\s*input\s*\{', formatted, re.MULTILINE):
-        errors.append("Warning: No input block found. Pipeline may be missing essential configuration as per https://logstash-kafka.readthedocs.io/en/stable/configuration/")
-    if not re.search(r'^\s*output\s*\{', formatted, re.MULTILINE):
-        errors.append("Warning: No output block found. Pipeline may be missing essential configuration as per https://logstash-kafka.readthedocs.io/en/stable/configuration/")
-    if not re.search(r'^\s*filter\s*\{', formatted, re.MULTILINE):
-        errors.append("Warning: No filter block found. Consider adding filters for processing events as per https://www.elastic.co/docs/reference/logstash/config-examples")
+    errors.extend(state.quote_errors())
+    if state.brace_stack:
+        for open_line in state.brace_stack:
+            errors.append(f"Line {open_line}: Missing closing brace '}}' - attempting auto-fix.")
+        yield from _closing_brace_lines(state.brace_stack, fixes_applied)
+    yield from held
+
+
+def format_logstash_pipeline_stream(lines, errors=None, fixes_applied=None, max_length=MAX_LINE_LENGTH):
+    """
+    Streaming variant of format_logstash_pipeline.
+
+    Takes any iterable of lines (for example an open file) and yields the
+    formatted lines one by one, without keeping the document in memory.
+    Errors and fixes are appended to the given lists while the generator runs;
+    the missing-section warnings are added once it is exhausted.
 
+    The output matches format_logstash_pipeline, except that fixes are listed
+    in the order they are found.
+    """
+    if errors is None:
+        errors = []
+    if fixes_applied is None:
+        fixes_applied = []
+    state = _FormatState()
+    found_sections = set()
+
+    timer = metrics.PhaseTimer() if metrics.phase_observer is not None else None
+    token_lines = _timed(timer, 'tokenize', tokenize_lines(lines))
+    formatted_lines = _timed(timer, 'format_lines', _format_token_lines(token_lines, errors, fixes_applied, state))
+    repaired_lines = _timed(timer, 'repair', _close_open_blocks(formatted_lines, state, errors, fixes_applied))
+    wrapped_lines = _timed(timer, 'wrap', _wrap_lines(repaired_lines, fixes_applied, max_length))
+    yield from _timed(timer, 'cleanup', _clean_whitespace(wrapped_lines, fixes_applied, found_sections))
+
+    errors.extend(_section_warnings(found_sections))
+    if timer is not None:
+        timer.report(metrics.phase_observer)
+
+
+def _write_formatted(source, temp, errors, fixes_applied, max_length):
+    """Writes the formatted lines of source to temp; False if source raised EncodingChanged."""
+    temp.write(source.bom)
+    target = io.TextIOWrapper(temp, encoding=source.encoding, newline=source.newline)
+    try:
+        separator = ""
+        has_text = False
+        for line in format_logstash_pipeline_stream(source.lines(), errors, fixes_applied, max_length):
+            target.write(separator)
+            target.write(line)
+            has_text = has_text or bool(separator or line)
+            separator = "\n"
+        # Like cli.py --write: a file that is not empty ends with a newline
+        if has_text:
+            target.write("\n")
+    except EncodingChanged:
+        return False
+    finally:
+        target.flush()
+        target.detach()
+    return True
+
+
+def format_pipeline_file(source_path, target_path, max_length=MAX_LINE_LENGTH):
+    """
+    Formats a pipeline file into target_path, line by line.
+
+    The formatted output is written to a temporary file next to target_path
+    and moved into place when done, so source_path and target_path may be the
+    same file. It keeps the encoding, byte order mark and line endings of the
+    source, and ends the file with a newline unless it is empty.
+
+    Returns:
+        errors (list): List of error messages with line numbers.
+        fixes_applied (list): List of automatic fixes that were applied.
+    """
+    errors = []
+    fixes_applied = []
+    temp_path = None
+    try:
+        target_dir = os.path.dirname(os.path.abspath(target_path))
+        with PipelineFile(source_path) as source, \
+                tempfile.NamedTemporaryFile('wb', dir=target_dir, suffix='.tmp', delete=False) as temp:
+            temp_path = temp.name
+            while not _write_formatted(source, temp, errors, fixes_applied, max_length):
+                # The encoding was guessed wrong; start over in the corrected one
+                errors.clear()
+                fixes_applied.clear()
+                temp.seek(0)
+                temp.truncate()
+        os.replace(temp_path, target_path)
+    except Exception as e:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return [str(e)], []
+    return errors, fixes_applied
+
+
+def _formatter_options(max_length=MAX_LINE_LENGTH, validate=True, structured=False):
+    """Options that influence the formatter output; part of the result cache key."""
+    return (max_length, validate, structured)
+
+
+def _is_error(message):
+    return not message.startswith("Warning:")
+
+
+def _validate(pipeline_text, errors, config=None):
+    """
+    Adds the warnings of utils.validator to errors, timed as the 'validate'
+    phase. With config the checks use that parse tree of pipeline_text.
+    """
+    observer = metrics.phase_observer
+    start = time.perf_counter()
+    errors.extend(validate_pipeline(pipeline_text) if config is None else validate_config(config))
+    if observer is not None:
+        observer('validate', time.perf_counter() - start)
+
+
+def format_and_validate(pipeline_text, max_length=MAX_LINE_LENGTH):
+    """
+    format_logstash_pipeline plus the plugin schema checks of utils.validator.
+
+    The schema is only checked when the formatter found no errors, otherwise
+    the pipeline would not parse and the brace errors say enough.
+    """
+    formatted, errors, fixes_applied = format_logstash_pipeline(pipeline_text, max_length=max_length)
+    if not any(_is_error(message) for message in errors):
+        _validate(pipeline_text, errors)
+    return formatted, errors, fixes_applied
+
+
+def format_structured(pipeline_text, max_length=MAX_LINE_LENGTH, validate=True):
+    """
+    Formats a pipeline from its parse tree with utils.printer instead of line
+    by line, so every plugin, hash and array gets the same layout. The tree
+    comes from the shared parse cache and the plugin checks (with validate)
+    use the same tree, so the text is parsed once.
+
+    A pipeline that does not parse is formatted line by line, which repairs
+    what it can, as format_and_validate or format_logstash_pipeline would.
+
+    Returns:
+        The same (formatted, errors, fixes_applied) as format_logstash_pipeline;
+        a parsed pipeline has no fixes.
+    """
+    try:
+        config = parse_cached(pipeline_text)
+    except ParseError:
+        if validate:
+            return format_and_validate(pipeline_text, max_length)
+        return format_logstash_pipeline(pipeline_text, max_length=max_length)
+    formatted = print_config(config, max_length)
+    errors = _section_warnings({node.type for node in config.sections if isinstance(node, Section)})
+    if validate:
+        _validate(pipeline_text, errors, config)
+    return formatted, errors, []
+
+
+def set_disk_cache(directory, max_bytes=DEFAULT_DISK_MAX_BYTES):
+    """
+    Keeps results in a persistent cache in directory as well, so other
+    processes and later runs can use them; None turns it off. Also used as
+    the initializer of process pools. A cache that cannot be opened, such as
+    a corrupt database, is logged and formatting goes on without it.
+    """
+    global disk_cache
+    disk_cache = None
+    if directory:
+        try:
+            disk_cache = DiskCache(directory, max_bytes)
+        except (sqlite3.Error, OSError) as e:
+            logging.getLogger(__name__).warning("Result cache in %s is not used: %s", directory, e)
+
+
+@lru_cache(maxsize=None)
+def formatter_version():
+    """Short hash of the formatter sources and data files, part of the disk cache key."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in _VERSION_FILES:
+        with open(os.path.join(directory, name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def _result_to_json(result):
+    formatted, errors, fixes_applied = result
+    return [formatted, errors, [[fix.code, fix.line, fix.before, fix.after] for fix in fixes_applied]]
+
+
+def _result_from_json(value):
+    formatted, errors, fixes_applied = value
+    return formatted, errors, [Fix(*fix) for fix in fixes_applied]
+
+
+def _cached_result(key, source_size, format_func):
+    """
+    The result for key from result_cache, else from disk_cache, else from
+    format_func(); key is (content hash, formatter options).
+    """
+    result = result_cache.get(key)
+    if result is not None:
+        return result
+    disk = disk_cache
+    disk_key = None
+    if disk is not None:
+        content, options = key
+        disk_key = "-".join([content, formatter_version()] + [str(option) for option in options])
+        stored = disk.get(disk_key)
+        if stored is not None:
+            result = _result_from_json(stored)
+            result_cache.put(key, result, source_size)
+            return result
+
+    result = format_func()
+    result_cache.put(key, result, source_size)
+    if disk_key is not None:
+        disk.put(disk_key, _result_to_json(result))
+    return result
+
+
+def _format_text(text, use_cache, max_length, validate, structured):
+    if structured:
+        format_func = partial(format_structured, text, max_length=max_length, validate=validate)
+    else:
+        format_func = partial(format_and_validate if validate else format_logstash_pipeline, text,
+                              max_length=max_length)
+    if use_cache:
+        key = (content_hash(text), _formatter_options(max_length, validate, structured))
+        return _cached_result(key, len(text), format_func)
+    return format_func()
+
+
+def _format_source(source, max_length, validate):
+    """Formats an open PipelineFile as it is decoded, again if its encoding was guessed wrong."""
+    while True:
+        errors = []
+        fixes_applied = []
+        try:
+            formatted = "\n".join(format_logstash_pipeline_stream(source.lines(keep_text=validate), errors,
+                                                                  fixes_applied, max_length))
+            break
+        except EncodingChanged:
+            continue
+    if validate and not any(_is_error(message) for message in errors):
+        _validate(source.text(), errors)
     return formatted, errors, fixes_applied
 
 
-def check_pipeline_file(file_path):
+def _format_source_structured(source, max_length, validate):
+    """format_structured for an open PipelineFile, which needs its whole text."""
+    return format_structured(source.text(), max_length, validate)
+
+
+def check_pipeline_file(file_path, use_cache=True, max_length=MAX_LINE_LENGTH, validate=True, data=None,
+                        structured=False):
+    """
+    check_pipeline_text for a file. The file is memory-mapped and formatted
+    as it is decoded (see utils.pipeline_file), in the encoding it was written
+    in; the whole text is only decoded when the plugin checks need it, or
+    with structured, which formats the parse tree of the whole text. With
+    data the file is not read and those bytes are formatted instead.
+
+    Fixes are listed in the order they are found, as in
+    format_logstash_pipeline_stream.
+    """
     try:
-        with open(file_path, 'r') as file:
-            content = file.read()
-            formatted_content, errors, fixes_applied = format_logstash_pipeline(content)
-            return formatted_content, errors, fixes_applied
+        with PipelineFile(file_path, data) as source:
+            format_func = partial(_format_source_structured if structured else _format_source, source, max_length,
+                                  validate)
+            if not use_cache:
+                return format_func()
+            # For UTF-8 files this is the key check_pipeline_text uses as well
+            key = (source.content_hash(), _formatter_options(max_length, validate, structured))
+            return _cached_result(key, source.size, format_func)
     except Exception as e:
         return None, [str(e)], []
 
 
-def check_pipeline_text(pipeline_text):
+def iter_pipeline_results(pipeline_text, max_length=MAX_LINE_LENGTH, validate=True):
+    """
+    Streaming variant of check_pipeline_text for responses that are sent while
+    the formatter runs.
+
+    Yields:
+        ('lines', list): The next STREAM_CHUNK_LINES formatted lines.
+        ('error', str): An error or warning, as soon as it is found.
+        ('fix', Fix): An automatic fix, as soon as it is applied.
+
+    The plugin checks need the whole pipeline, so their warnings come last.
+    The result cache is not used.
+    """
+    errors = []
+    fixes_applied = []
+    reported_errors = reported_fixes = 0
+    chunk = []
+    for line in format_logstash_pipeline_stream(io.StringIO(pipeline_text), errors, fixes_applied, max_length):
+        chunk.append(line)
+        if len(chunk) < STREAM_CHUNK_LINES:
+            continue
+        yield 'lines', chunk
+        chunk = []
+        for message in errors[reported_errors:]:
+            yield 'error', message
+        for fix in fixes_applied[reported_fixes:]:
+            yield 'fix', fix
+        reported_errors, reported_fixes = len(errors), len(fixes_applied)
+
+    if chunk:
+        yield 'lines', chunk
+    if validate and not any(_is_error(message) for message in errors):
+        _validate(pipeline_text, errors)
+    for message in errors[reported_errors:]:
+        yield 'error', message
+    for fix in fixes_applied[reported_fixes:]:
+        yield 'fix', fix
+
+
+def check_pipeline_text(pipeline_text, use_cache=True, max_length=MAX_LINE_LENGTH, validate=True, structured=False):
     try:
-        formatted_content, errors, fixes_applied = format_logstash_pipeline(pipeline_text)
-        return formatted_content, errors, fixes_applied
+        return _format_text(pipeline_text, use_cache, max_length, validate, structured)
     except Exception as e:
-        return None, [str(e)], []
\ No newline at end of file
+        return None, [str(e)], []
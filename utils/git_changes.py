@@ -0,0 +1,116 @@
+import os
+import re
+import subprocess
+
+_HUNK_RE = re.compile(r'@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+_MESSAGE_LINE_RE = re.compile(r'(?:Warning: )?Line (\d+):')
+
+
+class GitError(Exception):
+    """git is not installed, the directory is not a repository or a revision is unknown."""
+
+
+def _git(args, cwd=None, binary=False):
+    try:
+        result = subprocess.run(["git", *args], cwd=cwd, capture_output=True,
+                                **({} if binary else dict(encoding="utf-8", errors="surrogateescape")))
+    except FileNotFoundError:
+        raise GitError("git is not installed")
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", "replace") if binary else result.stderr
+        raise GitError(stderr.strip() or f"git {args[0]} failed")
+    return result.stdout
+
+
+def _diff_args(revision=None, staged=False):
+    """
+    The git diff to look at: the index against HEAD (or revision) when staged,
+    else the working tree against revision, which may also be a range like
+    origin/main...HEAD. Without either, the working tree against HEAD.
+    """
+    args = ["diff", "--no-ext-diff", "--no-color"]
+    if staged:
+        args.append("--cached")
+    if revision or not staged:
+        args.append(revision or "HEAD")
+    return args
+
+
+def _relative(root, name, cwd):
+    return os.path.relpath(os.path.join(root, name), cwd or os.getcwd())
+
+
+def changed_files(extension, revision=None, staged=False, paths=(), cwd=None):
+    """
+    The files ending in extension that were added or changed in the diff (see
+    _diff_args), limited to paths. Deleted files are left out. Without revision
+    and staged, untracked files count as changed as well.
+
+    Returns:
+        files (list): Paths relative to cwd.
+        untracked (set): The paths of those files that git does not track yet.
+    """
+    root = _git(["rev-parse", "--show-toplevel"], cwd).strip()
+    output = _git(_diff_args(revision, staged) + ["--name-only", "-z", "--diff-filter=d", "--", *paths], cwd)
+    names = [name for name in output.split("\0") if name.endswith(extension)]
+    untracked = set()
+    if not revision and not staged:
+        output = _git(["ls-files", "--others", "--exclude-standard", "--full-name", "-z", "--", *paths], cwd)
+        untracked = {name for name in output.split("\0") if name.endswith(extension)}
+    files = sorted(set(names) | untracked)
+    return ([_relative(root, name, cwd) for name in files],
+            {_relative(root, name, cwd) for name in untracked})
+
+
+def staged_content(path, cwd=None):
+    """The bytes of path (relative to cwd) as staged in the index."""
+    return _git(["show", ":./" + path.replace(os.sep, "/")], cwd, binary=True)
+
+
+def changed_line_ranges(revision=None, staged=False, paths=(), cwd=None):
+    """
+    The lines added or changed on the new side of the diff, per file.
+
+    Returns:
+        ranges (dict): Path relative to cwd -> list of (first, last) line
+            numbers, 1-based and inclusive. Files with only deleted lines map
+            to an empty list.
+    """
+    root = _git(["rev-parse", "--show-toplevel"], cwd).strip()
+    output = _git(["-c", "core.quotePath=false"] + _diff_args(revision, staged) +
+                  ["-U0", "--src-prefix=a/", "--dst-prefix=b/", "--", *paths], cwd)
+    ranges = {}
+    current = None
+    in_header = False
+    for line in output.splitlines():
+        if line.startswith("diff --git "):
+            in_header = True
+            current = None
+        elif in_header and line.startswith("+++ "):
+            name = line[4:].strip('"')
+            current = None if name == "/dev/null" else ranges.setdefault(_relative(root, name[2:], cwd), [])
+        elif line.startswith("@@"):
+            # Added lines of the hunk may start with '+++' as well, so headers end here
+            in_header = False
+            match = _HUNK_RE.match(line)
+            if current is not None and match:
+                start, count = int(match.group(1)), int(match.group(2) or 1)
+                if count:
+                    current.append((start, start + count - 1))
+    return ranges
+
+
+def in_ranges(line_number, ranges):
+    """True if line_number is in one of ranges; None stands for the whole file."""
+    if ranges is None:
+        return True
+    return line_number is not None and any(first <= line_number <= last for first, last in ranges)
+
+
+def message_in_ranges(message, ranges):
+    """
+    True if the error or warning is about a line in ranges. Messages without
+    a line number, such as a missing output block, are about the whole file.
+    """
+    match = _MESSAGE_LINE_RE.match(message)
+    return match is None or in_ranges(int(match.group(1)), ranges)
@@ -0,0 +1,282 @@
+import os
+import re
+import sys
+import warnings
+from functools import lru_cache
+
+from utils.parser import Array, Comment, Hash, Plugin, Section, Setting, String, Conditional
+
+PATTERNS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grok-patterns")
+# Expanded and compiled patterns kept per process, shared by all files and requests
+COMPILED_CACHE_SIZE = 4096
+
+# %{SYNTAX}, %{SYNTAX:SEMANTIC} or %{SYNTAX:SEMANTIC:TYPE}
+_REFERENCE_RE = re.compile(r'%\{([^}:]*)(?::([^}:]*))?(?::([^}]*))?\}')
+_PATTERN_NAME_RE = re.compile(r'\w+$')
+_CONVERSIONS = ("int", "float")
+# Oniguruma constructs that Python's re spells differently
+_NAMED_GROUP_RE = re.compile(r'\(\?<(?![=!])([^>]*)>')
+_ONIG_ESCAPE_RE = re.compile(r'(?<!\\)((?:\\\\)*)\\([hz])')
+_ONIG_ESCAPES = {'h': '[0-9a-fA-F]', 'z': r'\Z'}
+# (?imx-imx): in Oniguruma the flags apply up to the end of the enclosing group, and m is Python's s
+_INLINE_FLAGS_RE = re.compile(r'\(\?([imx]*)(?:-([imx]*))?\)')
+_FLAG_NAMES = str.maketrans('m', 's')
+# Oniguruma syntax that Python's re has no equivalent for, like \p{Alpha}, \K or \k<name>
+_ONIG_ONLY_RE = re.compile(r'(?<!\\)(?:\\\\)*(\\[pPKRXGgk](?:\{[^}]*\}|<[^>]*>)?|\(\?~)')
+# Possessive quantifiers, which re only has from 3.11
+_POSSESSIVE_RE = re.compile(r'(?<!\\)[*+?}]\+')
+_UNSUPPORTED = "Unsupported Oniguruma syntax"
+
+
+class GrokError(ValueError):
+    """Raised when a grok pattern cannot be expanded."""
+
+
+@lru_cache(maxsize=None)
+def load_patterns(path=PATTERNS_PATH):
+    """Reads a grok pattern file (NAME regex per line) into a dict."""
+    patterns = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            name, _, pattern = line.partition(" ")
+            patterns[name] = pattern.strip()
+    return patterns
+
+
+def _to_python(regex):
+    """Rewrites the Oniguruma syntax used in grok patterns for Python's re."""
+    regex = _NAMED_GROUP_RE.sub('(?:', regex)
+    regex = _ONIG_ESCAPE_RE.sub(lambda m: m.group(1) + _ONIG_ESCAPES[m.group(2)], regex)
+    if sys.version_info < (3, 11):
+        # Atomic groups only exist in re from 3.11; they do not change whether a pattern compiles
+        regex = regex.replace('(?>', '(?:')
+    return regex
+
+
+def _scope_inline_flags(regex):
+    """
+    Rewrites inline flags like (?m) in the middle of a regex, which re
+    rejects, into a scoped group (?s:...) that ends with the enclosing group.
+    """
+    if '(?' not in regex:
+        return regex
+    parts = []
+    # Per open group, the number of scoped flag groups to close with it
+    scopes = [0]
+    index = 0
+    class_depth = 0
+    length = len(regex)
+    while index < length:
+        char = regex[index]
+        if char == '\\':
+            parts.append(regex[index:index + 2])
+            index += 2
+            continue
+        if class_depth:
+            if char == '[':
+                class_depth += 1
+            elif char == ']':
+                class_depth -= 1
+        elif char == '[':
+            class_depth = 1
+            # A ']' right after '[' or '[^' is a literal
+            end = index + 2 if regex.startswith('[^', index) else index + 1
+            if regex.startswith(']', end):
+                parts.append(regex[index:end + 1])
+                index = end + 1
+                continue
+        elif char == '(':
+            match = _INLINE_FLAGS_RE.match(regex, index)
+            if match and (match.group(1) or match.group(2)):
+                on, off = match.group(1).translate(_FLAG_NAMES), (match.group(2) or '').translate(_FLAG_NAMES)
+                parts.append(f"(?{on}-{off}:" if off else f"(?{on}:")
+                scopes[-1] += 1
+                index = match.end()
+                continue
+            scopes.append(0)
+        elif char == ')' and len(scopes) > 1:
+            parts.append(')' * scopes.pop())
+        parts.append(char)
+        index += 1
+    parts.append(')' * scopes[0])
+    return ''.join(parts)
+
+
+def _unsupported_syntax(regex):
+    """Returns the first Oniguruma construct in regex that re cannot compile, or None."""
+    match = _ONIG_ONLY_RE.search(regex)
+    if match:
+        return match.group(1)
+    if sys.version_info < (3, 11):
+        match = _POSSESSIVE_RE.search(regex)
+        if match:
+            return match.group()
+    return None
+
+
+def expand(pattern, definitions=(), library=None):
+    """
+    Replaces the %{NAME:field:type} references in pattern by their regexes.
+
+    definitions are extra (name, regex) pairs, like pattern_definitions of the
+    grok filter; they take precedence over the library.
+
+    Returns:
+        regex (str): The expanded pattern, in Python re syntax.
+        fields (list): The field names captured by the pattern.
+
+    Raises GrokError for unknown patterns, unknown type conversions and
+    patterns that refer to themselves.
+    """
+    library = library if library is not None else load_patterns()
+    lookup = dict(definitions)
+    fields = []
+    expanded = {}
+
+    def expand_text(text, path):
+        parts = []
+        position = 0
+        for match in _REFERENCE_RE.finditer(text):
+            name, field, conversion = match.groups()
+            parts.append(_to_python(text[position:match.start()]))
+            position = match.end()
+            if not _PATTERN_NAME_RE.match(name):
+                raise GrokError(f"Invalid grok reference {match.group()}")
+            if conversion is not None and conversion not in _CONVERSIONS:
+                raise GrokError(f"Unknown type '{conversion}' in {match.group()}, use int or float")
+            if name in path:
+                raise GrokError(f"Grok pattern %{{{name}}} refers to itself")
+            if name not in expanded:
+                source = lookup.get(name, library.get(name))
+                if source is None:
+                    raise GrokError(f"Unknown grok pattern %{{{name}}}")
+                expanded[name] = expand_text(source, path | {name})
+            if field:
+                fields.append(field)
+                parts.append(f"(?P<g{len(fields)}>{expanded[name]})")
+            else:
+                parts.append(f"(?:{expanded[name]})")
+        parts.append(_to_python(text[position:]))
+        return "".join(parts)
+
+    return _scope_inline_flags(expand_text(pattern, frozenset())), fields
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_grok(pattern, definitions=()):
+    """
+    Expands and compiles a grok pattern against the bundled pattern library.
+
+    Results are cached by pattern and definitions, so a pattern used in many
+    pipelines is only compiled once per process.
+
+    Returns:
+        (regex, error): the compiled re.Pattern and None, or None and the error
+            message. A pattern that only fails on Oniguruma syntax re does not
+            have gets an error starting with "Unsupported Oniguruma syntax".
+    """
+    try:
+        regex, _ = expand(pattern, definitions)
+    except GrokError as e:
+        return None, str(e)
+    try:
+        with warnings.catch_warnings():
+            # Oniguruma character classes like [[:alpha:]] make re warn about nested sets
+            warnings.simplefilter("ignore", FutureWarning)
+            return re.compile(regex), None
+    except re.error as e:
+        construct = _unsupported_syntax(regex)
+        if construct is not None:
+            return None, f"{_UNSUPPORTED} {construct} ({e.msg})"
+        return None, f"Invalid regular expression: {e.msg}"
+
+
+def _match_patterns(value):
+    """Yields (field, String node) for the patterns in the value of a grok match setting."""
+    if isinstance(value, Hash):
+        for entry in value.entries:
+            if isinstance(entry, Setting):
+                for pattern in _strings(entry.value):
+                    yield entry.name, pattern
+    elif isinstance(value, Array):
+        # Legacy form: ["field", "pattern", "field", "pattern", ...]
+        items = [item for item in value.items if not isinstance(item, Comment)]
+        for index in range(0, len(items) - 1, 2):
+            field = items[index].value if isinstance(items[index], String) else None
+            for pattern in _strings(items[index + 1]):
+                yield field, pattern
+
+
+def _strings(value):
+    if isinstance(value, String):
+        return [value]
+    if isinstance(value, Array):
+        return [item for item in value.items if isinstance(item, String)]
+    return []
+
+
+def _plugin_setting(plugin, name):
+    for setting in plugin.settings:
+        if isinstance(setting, Setting) and setting.name == name:
+            return setting.value
+    return None
+
+
+def _grok_plugins(items):
+    for node in items:
+        if isinstance(node, Plugin):
+            if node.name == "grok":
+                yield node
+        elif isinstance(node, Conditional):
+            for branch in node.branches:
+                yield from _grok_plugins(branch.body)
+
+
+def check_grok(config):
+    """
+    Expands and compiles the patterns of every grok filter in a parsed pipeline.
+
+    Returns:
+        messages (list): Errors like 'Line N: ...' for patterns that do not
+            compile, and warnings for patterns that contain line breaks, refer
+            to patterns the bundled library does not have or use Oniguruma
+            syntax that cannot be checked with re.
+    """
+    messages = []
+    for section in config.sections:
+        if not isinstance(section, Section) or section.type != "filter":
+            continue
+        for plugin in _grok_plugins(section.body):
+            definitions = ()
+            custom = _plugin_setting(plugin, "pattern_definitions")
+            if isinstance(custom, Hash):
+                definitions = tuple(sorted(
+                    (entry.name, entry.value.value) for entry in custom.entries
+                    if isinstance(entry, Setting) and isinstance(entry.value, String)
+                ))
+            # Patterns from patterns_dir are not known here, so unknown names are not reported
+            has_pattern_files = _plugin_setting(plugin, "patterns_dir") is not None or \
+                _plugin_setting(plugin, "patterns_files_glob") is not None
+
+            match = _plugin_setting(plugin, "match")
+            for field, pattern in _match_patterns(match):
+                label = f"Grok pattern for '{field}'" if field else "Grok pattern"
+                if "\n" in pattern.value:
+                    messages.append(f"Warning: Line {pattern.line}: {label} contains a line break; "
+                                    f"it only matches messages with the same line break and indentation")
+                _, error = compile_grok(pattern.value, definitions)
+                if error is None:
+                    continue
+                if error.startswith("Unknown grok pattern"):
+                    # The bundled library is a subset of the patterns Logstash ships with
+                    if not has_pattern_files:
+                        messages.append(f"Warning: Line {pattern.line}: {label} was not checked: {error}")
+                    continue
+                if error.startswith(_UNSUPPORTED):
+                    messages.append(f"Warning: Line {pattern.line}: {label} could not be checked: {error}")
+                    continue
+                messages.append(f"Line {pattern.line}: {label} does not compile: {error}")
+    return messages
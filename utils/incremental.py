@@ -0,0 +1,207 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from utils.cache import content_hash
+from utils.formatter import (
+    MAX_LINE_LENGTH, _cached_result, _finish_output, _format_token_lines, _FormatState, _formatter_options, _is_error,
+    _validate, _wrap_lines, format_logstash_pipeline,
+)
+from utils.tokenizer import tokenize_lines
+
+# Documents per process whose last version is kept for format_document; the least recently used is dropped
+MAX_DOCUMENTS = 32
+
+_LINE_NUMBER_RE = re.compile(r'^Line (\d+):')
+_SECTION_OPEN_RE = re.compile(r'\s*(?:input|filter|output)\s*\{')
+_formatters = OrderedDict()
+_formatters_lock = threading.Lock()
+
+
+def _shift_errors(errors, offset):
+    """Moves the 'Line N:' prefix of block-relative errors to document line numbers."""
+    if not offset:
+        return errors
+    return [_LINE_NUMBER_RE.sub(lambda m: f"Line {int(m.group(1)) + offset}:", error, count=1) for error in errors]
+
+
+def _split_blocks(lines, max_depth):
+    """
+    Splits lines into blocks that end wherever the brace depth drops to
+    max_depth or less, counting braces the way the formatter does.
+
+    Returns:
+        blocks (list): (start, end, depth) per block, where depth is the brace
+            depth before the block's first line.
+        depth (int): The brace depth after the last line.
+        nested_section (bool): A line opens an input, filter or output block
+            inside another block, where the formatter closes the open blocks.
+    """
+    blocks = []
+    depth = 0
+    start = 0
+    entry_depth = 0
+    nested_section = False
+    for index, line in enumerate(lines):
+        if depth and not nested_section and _SECTION_OPEN_RE.match(line):
+            nested_section = True
+        closes = line.count('}')
+        if closes <= depth:
+            depth += line.count('{') - closes
+        else:
+            # Extra closing braces never take the depth below zero
+            for char in line:
+                if char == '{':
+                    depth += 1
+                elif char == '}' and depth:
+                    depth -= 1
+        if depth <= max_depth:
+            blocks.append((start, index + 1, entry_depth))
+            start = index + 1
+            entry_depth = depth
+    if start < len(lines):
+        blocks.append((start, len(lines), entry_depth))
+    return blocks, depth, nested_section
+
+
+class _Block:
+    """Formatter output for one block, with line numbers relative to the block."""
+
+    __slots__ = (
+        'lines', 'errors', 'line_fixes', 'wrap_fixes', 'quote_toggles', 'quote_start_line', 'repaired', 'exit_state',
+    )
+
+    def __init__(self, source_lines, entry_state, max_length):
+        self.errors = []
+        self.line_fixes = []
+        self.wrap_fixes = []
+        open_blocks, indent_reliable = entry_state
+        state = _FormatState(len(open_blocks), open_blocks)
+        state.indent_reliable = indent_reliable
+        formatted_lines = _format_token_lines(tokenize_lines(source_lines), self.errors, self.line_fixes, state)
+        self.lines = list(_wrap_lines(formatted_lines, self.wrap_fixes, max_length))
+        self.quote_toggles = state.quote_toggles
+        self.quote_start_line = state.quote_start_line
+        self.repaired = state.repaired
+        # The open blocks and indentation state the next block starts with
+        self.exit_state = (tuple(tuple(block) for block in state.blocks), state.indent_reliable)
+
+
+class IncrementalFormatter:
+    """
+    Formats successive versions of the same pipeline, reformatting only the
+    blocks that changed since the previous call.
+
+    The document is cut into blocks wherever the brace depth drops to
+    max_depth (1: the plugins and conditionals inside input/filter/output).
+    A block's output only depends on its text and the blocks open when it
+    starts (with the indentation of their opening lines), so unchanged blocks
+    are spliced in from the previous call. Only the blocks of the last call
+    are kept.
+
+    Results are identical to format_logstash_pipeline. Documents with missing
+    closing braces, or a section opened inside another block, are formatted
+    in full, because the repair works on the whole document.
+    """
+
+    def __init__(self, max_depth=1, max_length=MAX_LINE_LENGTH):
+        self.max_depth = max_depth
+        self.max_length = max_length
+        self._blocks = {}
+        self.reused_blocks = 0
+        self.formatted_blocks = 0
+
+    def format(self, file_content):
+        """Same as format_logstash_pipeline(file_content, max_length=self.max_length)."""
+        lines = file_content.splitlines()
+        blocks, final_depth, nested_section = _split_blocks(lines, self.max_depth)
+        if final_depth or nested_section:
+            self._blocks = {}
+            return format_logstash_pipeline(file_content, max_length=self.max_length)
+
+        errors = []
+        line_fixes = []
+        wrap_fixes = []
+        wrapped_lines = []
+        quote_toggles = 0
+        quote_start_line = None
+        previous_blocks = self._blocks
+        current_blocks = {}
+        entry_state = ((), None)
+        for start, end, _ in blocks:
+            key = ("\n".join(lines[start:end]), entry_state)
+            block = current_blocks.get(key) or previous_blocks.get(key)
+            if block is None:
+                block = _Block(lines[start:end], entry_state, self.max_length)
+                self.formatted_blocks += 1
+            else:
+                self.reused_blocks += 1
+            if block.repaired:
+                # A missing brace found from the indentation; its line number is only known in the whole document
+                self._blocks = {}
+                return format_logstash_pipeline(file_content, max_length=self.max_length)
+            current_blocks[key] = block
+            entry_state = block.exit_state
+
+            wrapped_lines.extend(block.lines)
+            errors.extend(_shift_errors(block.errors, start))
+            if start:
+                line_fixes.extend([fix.shifted(start) for fix in block.line_fixes])
+            else:
+                line_fixes.extend(block.line_fixes)
+            wrap_fixes.extend(block.wrap_fixes)
+            if block.quote_toggles:
+                quote_toggles += block.quote_toggles
+                quote_start_line = block.quote_start_line + start
+        self._blocks = current_blocks
+
+        state = _FormatState()
+        state.quote_toggles = quote_toggles
+        state.quote_start_line = quote_start_line
+        errors.extend(state.quote_errors())
+
+        fixes_applied = line_fixes + wrap_fixes
+        formatted = _finish_output(wrapped_lines, errors, fixes_applied)
+        return formatted, errors, fixes_applied
+
+
+def _format_incremental(formatter, text, validate):
+    formatted, errors, fixes_applied = formatter.format(text)
+    if validate and not any(_is_error(message) for message in errors):
+        _validate(text, errors)
+    return formatted, errors, fixes_applied
+
+
+def format_document(document, text, use_cache=True, max_length=MAX_LINE_LENGTH, validate=True):
+    """
+    check_pipeline_text for successive versions of the same document, such as
+    a file an editor submits on every save: document (any hashable key) picks
+    the IncrementalFormatter of its previous version, so only the blocks that
+    changed are formatted again. The formatters of the MAX_DOCUMENTS most
+    recently used documents are kept in this process.
+
+    The results, and the result cache entries, are the same as those of
+    check_pipeline_text, so a key shared by unrelated documents only costs
+    reuse.
+    """
+    key = (document, max_length)
+    with _formatters_lock:
+        # Taken out while in use, so two requests never share a formatter
+        formatter = _formatters.pop(key, None)
+    if formatter is None:
+        formatter = IncrementalFormatter(max_length=max_length)
+    try:
+        format_func = partial(_format_incremental, formatter, text, validate)
+        if use_cache:
+            return _cached_result((content_hash(text), _formatter_options(max_length, validate)), len(text),
+                                  format_func)
+        return format_func()
+    except Exception as e:
+        return None, [str(e)], []
+    finally:
+        with _formatters_lock:
+            _formatters[key] = formatter
+            _formatters.move_to_end(key)
+            while len(_formatters) > MAX_DOCUMENTS:
+                _formatters.popitem(last=False)
@@ -0,0 +1,194 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the latency histograms
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_text(label_names, values):
+    if not label_names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """A monotonically increasing value per combination of labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_label_text(self.label_names, key)} {value}"
+
+
+class Histogram:
+    """Counts observations in cumulative buckets, with their sum, per combination of labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in values:
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-2] + [counts[-2]]):
+                labels = _label_text(self.label_names + ("le",), key + (bound,))
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _label_text(self.label_names, key)
+            yield f"{self.name}_count{labels} {counts[-2]}"
+            yield f"{self.name}_sum{labels} {counts[-1]}"
+
+
+class Registry:
+    """The metrics of a process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+documents_total = registry.counter(
+    "formatter_documents_total", "Pipeline documents formatted")
+bytes_total = registry.counter(
+    "formatter_bytes_total", "Characters of pipeline text formatted")
+lines_total = registry.counter(
+    "formatter_lines_total", "Lines of pipeline text formatted")
+phase_seconds = registry.histogram(
+    "formatter_phase_seconds", "Time spent in each formatter phase", ("phase",))
+
+# Called as phase_observer(phase, seconds) after each timed document; None disables phase timing
+phase_observer = None
+
+
+def observe_phase(phase, seconds):
+    phase_seconds.observe(seconds, phase=phase)
+
+
+def enable_phase_timing(observer=observe_phase):
+    """
+    Turns the per-phase timing of the formatter on. It costs about a tenth of
+    the formatting time, so it is off unless asked for.
+    """
+    global phase_observer
+    phase_observer = observer
+
+
+def disable_phase_timing():
+    global phase_observer
+    phase_observer = None
+
+
+def record_document(text):
+    """Counts a formatted document, its size and its lines."""
+    documents_total.inc()
+    bytes_total.inc(len(text))
+    lines_total.inc(text.count("\n") + 1 if text else 0)
+
+
+@contextmanager
+def collect_phase_times():
+    """
+    Times the formatter phases inside the block into a list of (phase, seconds),
+    for example in a pool worker that sends them back to the server process.
+    """
+    global phase_observer
+    previous = phase_observer
+    times = []
+    phase_observer = lambda phase, seconds: times.append((phase, seconds))
+    try:
+        yield times
+    finally:
+        phase_observer = previous
+
+
+class PhaseTimer:
+    """
+    Times the stages of a chain of generators.
+
+    Each stage is wrapped with wrap() in pipeline order. The time measured
+    around a stage includes the stages before it, so report() subtracts the
+    time of the previous stage.
+    """
+
+    def __init__(self):
+        self._inclusive = {}
+
+    def wrap(self, phase, iterable):
+        clock = time.perf_counter
+        iterator = iter(iterable)
+        total = 0.0
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    total += clock() - start
+                    return
+                total += clock() - start
+                yield item
+        finally:
+            self._inclusive[phase] = total
+
+    def report(self, observer):
+        upstream = 0.0
+        for phase, inclusive in self._inclusive.items():
+            observer(phase, max(0.0, inclusive - upstream))
+            upstream = inclusive
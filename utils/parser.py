@@ -0,0 +1,527 @@
+import bisect
+import re
+
+from utils.cache import ParseCache
+
+SECTION_TYPES = ("input", "filter", "output")
+
+# Shared by everything that needs the structure of a pipeline, so a text is only parsed once
+parse_cache = ParseCache()
+
+_LEXER_RE = re.compile(
+    r'(?P<space>\s+)'
+    r'|(?P<comment>#[^\r\n]*)'
+    r'|(?P<string>"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')'
+    r'|(?P<op>=>|==|!=|=~|!~|<=|>=|[<>!,])'
+    r'|(?P<punct>[{}\[\]()])'
+    # ${VAR} environment references and %{field} templates can be part of a bare word
+    r'|(?P<word>(?:[$%]\{[^{}\s]*\}|[^\s{}\[\](),"\'=<>!~#])+)',
+    re.DOTALL,
+)
+_REGEX_RE = re.compile(r'/(?:[^/\\\r\n]|\\.)*/')
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?$')
+# Operators after which '/' starts a regular expression instead of a word
+_MATCH_OPERATORS = frozenset(['=~', '!~'])
+
+
+class ParseError(ValueError):
+    """Raised when a pipeline cannot be parsed; line and column are 1-based."""
+
+    def __init__(self, message, line, column):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
+        self.column = column
+
+
+class Node:
+    """
+    Base class of the pipeline AST nodes.
+
+    start and end are the character offsets of the node in the source text,
+    line is the line number (1-based) of its first character.
+    """
+
+    __slots__ = ('start', 'end', 'line')
+
+    def __repr__(self):
+        return f"{type(self).__name__}(line={self.line})"
+
+
+class Config(Node):
+    """A whole pipeline: its sections, with top-level comments in between."""
+
+    __slots__ = ('sections',)
+
+    def __init__(self, sections):
+        self.sections = sections
+
+
+class Section(Node):
+    """An input, filter or output block; body holds plugins, conditionals and comments."""
+
+    __slots__ = ('type', 'body')
+
+    def __init__(self, type, body):
+        self.type = type
+        self.body = body
+
+
+class Plugin(Node):
+    """
+    A plugin block such as `grok { ... }`; also used for codec values like
+    `json { ... }`. settings holds Setting and Comment nodes (and Plugin nodes
+    for blocks wrongly nested in a plugin).
+    """
+
+    __slots__ = ('name', 'settings')
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.settings = settings
+
+
+class Setting(Node):
+    """
+    `name => value` inside a plugin, or `key => value` inside a hash. name is
+    without quotes; name_quote is the quote it had in the source, if any.
+    """
+
+    __slots__ = ('name', 'value', 'name_quote')
+
+    def __init__(self, name, value, name_quote=None):
+        self.name = name
+        self.value = value
+        self.name_quote = name_quote
+
+
+class Conditional(Node):
+    """An if / else if / else chain; branches is a list of Branch."""
+
+    __slots__ = ('branches',)
+
+    def __init__(self, branches):
+        self.branches = branches
+
+
+class Branch(Node):
+    """
+    One branch of a Conditional; kind is 'if', 'else if' or 'else' (condition
+    None). comments holds the Comment nodes between the previous branch and
+    this one's else.
+    """
+
+    __slots__ = ('kind', 'condition', 'body', 'comments')
+
+    def __init__(self, kind, condition, body, comments=()):
+        self.kind = kind
+        self.condition = condition
+        self.body = body
+        self.comments = list(comments)
+
+
+class Condition(Node):
+    """
+    The expression of an if / else if, as normalized source text. comments
+    holds the Comment nodes written between its lines.
+    """
+
+    __slots__ = ('text', 'comments')
+
+    def __init__(self, text, comments=()):
+        self.text = text
+        self.comments = list(comments)
+
+
+class String(Node):
+    """A quoted string; value is the text between the quotes, escapes untouched."""
+
+    __slots__ = ('value', 'quote')
+
+    def __init__(self, value, quote='"'):
+        self.value = value
+        self.quote = quote
+
+
+class Number(Node):
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Bareword(Node):
+    """An unquoted value such as `true` or `json`."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Array(Node):
+    """`[a, b]`; items may include Comment nodes."""
+
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+
+class Hash(Node):
+    """`{ key => value ... }`; entries are Setting (and Comment) nodes."""
+
+    __slots__ = ('entries',)
+
+    def __init__(self, entries):
+        self.entries = entries
+
+
+class Comment(Node):
+    """
+    A `#` comment; text includes the '#'. trailing is True for a comment at
+    the end of a line with other content.
+    """
+
+    __slots__ = ('text', 'trailing')
+
+    def __init__(self, text, trailing=False):
+        self.text = text
+        self.trailing = trailing
+
+
+def _lex(text):
+    """
+    Splits text into (kind, value, offset) tokens, without whitespace.
+
+    kind is 'comment', 'string', 'regex', 'op', 'punct' or 'word'.
+    """
+    tokens = []
+    append = tokens.append
+    position = 0
+    length = len(text)
+    previous = None
+    match_re = _LEXER_RE.match
+    while position < length:
+        if previous in _MATCH_OPERATORS and text[position] == '/':
+            match = _REGEX_RE.match(text, position)
+            if match:
+                append(('regex', match.group(), position))
+                previous = match.group()
+                position = match.end()
+                continue
+        match = match_re(text, position)
+        if match is None:
+            # A lone quote or character the grammar does not know; the parser reports it
+            append(('error', text[position], position))
+            position += 1
+            continue
+        kind = match.lastgroup
+        if kind != 'space':
+            value = match.group()
+            append((kind, value, position))
+            if kind != 'comment':
+                previous = value
+        position = match.end()
+    return tokens
+
+
+def _join_condition(tokens):
+    """Joins the tokens of a condition with single spaces, except around brackets and parentheses."""
+    parts = []
+    previous = None
+    for _, value, _ in tokens:
+        if parts and not (previous in ('[', '(', '!') or value in (']', ')', ',') or
+                          (previous == ']' and value == '[')):
+            parts.append(' ')
+        parts.append(value)
+        previous = value
+    return ''.join(parts)
+
+
+class _Parser:
+    """Recursive-descent parser over the tokens of _lex."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _lex(text)
+        self.index = 0
+        self._line_starts = [0] + [match.end() for match in re.finditer(r'\r\n|\r|\n', text)]
+
+    # Helpers
+
+    def line_of(self, offset):
+        return bisect.bisect_right(self._line_starts, offset)
+
+    def error(self, message, offset=None):
+        if offset is None:
+            offset = self.tokens[self.index][2] if self.index < len(self.tokens) else len(self.text)
+        line = self.line_of(offset)
+        raise ParseError(message, line, offset - self._line_starts[line - 1] + 1)
+
+    def peek(self, ahead=0):
+        index = self.index + ahead
+        if index < len(self.tokens):
+            return self.tokens[index]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            self.error("Unexpected end of pipeline")
+        self.index += 1
+        return token
+
+    def expect(self, value, what=None):
+        token = self.peek()
+        if token is None or token[1] != value or token[0] in ('string', 'comment'):
+            found = "end of pipeline" if token is None else repr(token[1])
+            self.error(f"Expected {what or repr(value)}, found {found}")
+        self.index += 1
+        return token
+
+    def at(self, value):
+        token = self.peek()
+        return token is not None and token[1] == value and token[0] in ('op', 'punct', 'word')
+
+    def node(self, node, start, end=None):
+        node.start = start
+        node.end = self.tokens[self.index - 1][2] + len(self.tokens[self.index - 1][1]) if end is None else end
+        node.line = self.line_of(start)
+        return node
+
+    def comment(self):
+        kind, value, offset = self.next()
+        trailing = False
+        if self.index > 1:
+            _, previous, previous_offset = self.tokens[self.index - 2]
+            trailing = self.line_of(previous_offset + len(previous)) == self.line_of(offset)
+        return self.node(Comment(value, trailing), offset, offset + len(value))
+
+    # Grammar
+
+    def config(self):
+        sections = []
+        while self.peek() is not None:
+            kind, value, offset = self.peek()
+            if kind == 'comment':
+                sections.append(self.comment())
+            elif kind == 'word' and value in SECTION_TYPES:
+                self.index += 1
+                self.expect('{')
+                body = self.body()
+                self.expect('}')
+                sections.append(self.node(Section(value, body), offset))
+            else:
+                self.error(f"Expected input, filter or output, found {value!r}")
+        return self.node(Config(sections), 0, len(self.text))
+
+    def body(self):
+        """Plugins, conditionals and comments up to the closing '}'."""
+        items = []
+        while True:
+            token = self.peek()
+            if token is None or (token[0] == 'punct' and token[1] == '}'):
+                return items
+            kind, value, offset = token
+            if kind == 'comment':
+                items.append(self.comment())
+            elif kind == 'word' and value == 'if':
+                items.append(self.conditional())
+            elif kind == 'word':
+                items.append(self.plugin())
+            else:
+                self.error(f"Expected a plugin or conditional, found {value!r}")
+
+    def plugin(self):
+        kind, name, offset = self.next()
+        self.expect('{', f"'{{' after plugin name {name!r}")
+        settings = []
+        while not self.at('}'):
+            token = self.peek()
+            if token is None:
+                self.error(f"Missing closing brace for plugin {name!r}", offset)
+            if token[0] == 'comment':
+                settings.append(self.comment())
+            elif token[0] == 'word' and (self.peek(1) or ('', ''))[1] == '{':
+                # Not valid Logstash, but kept in the tree so validators can report it
+                settings.append(self.plugin())
+            else:
+                settings.append(self.setting())
+        self.expect('}')
+        return self.node(Plugin(name, settings), offset)
+
+    def setting(self):
+        kind, name, offset = self.next()
+        quote = None
+        if kind == 'string':
+            quote = name[0]
+            name = name[1:-1]
+        elif kind != 'word':
+            self.error(f"Expected a setting name, found {name!r}", offset)
+        self.expect('=>', f"'=>' after {name!r}")
+        value = self.value()
+        return self.node(Setting(name, value, quote), offset)
+
+    def value(self):
+        token = self.peek()
+        if token is None:
+            self.error("Expected a value, found end of pipeline")
+        kind, value, offset = token
+        if kind == 'string':
+            self.index += 1
+            return self.node(String(value[1:-1], value[0]), offset)
+        if kind == 'punct' and value == '[':
+            return self.array()
+        if kind == 'punct' and value == '{':
+            return self.hash()
+        if kind == 'word':
+            self.index += 1
+            if _NUMBER_RE.match(value):
+                return self.node(Number(value), offset)
+            if self.at('{'):
+                # A codec with settings, like `codec => json { charset => "UTF-8" }`
+                self.index -= 1
+                return self.plugin()
+            return self.node(Bareword(value), offset)
+        self.error(f"Expected a value, found {value!r}")
+
+    def array(self):
+        kind, _, offset = self.next()
+        items = []
+        while not self.at(']'):
+            token = self.peek()
+            if token is None:
+                self.error("Missing closing bracket ']'", offset)
+            if token[0] == 'comment':
+                items.append(self.comment())
+                continue
+            items.append(self.value())
+            if self.at(','):
+                self.index += 1
+            elif not self.at(']') and (self.peek() or ('',))[0] != 'comment':
+                self.error("Expected ',' or ']' in array")
+        self.expect(']')
+        return self.node(Array(items), offset)
+
+    def hash(self):
+        kind, _, offset = self.next()
+        entries = []
+        while not self.at('}'):
+            token = self.peek()
+            if token is None:
+                self.error("Missing closing brace '}' for hash", offset)
+            if token[0] == 'comment':
+                entries.append(self.comment())
+                continue
+            entries.append(self.setting())
+            if self.at(','):
+                self.index += 1
+        self.expect('}')
+        return self.node(Hash(entries), offset)
+
+    def conditional(self):
+        start = self.peek()[2]
+        branches = [self.branch('if')]
+        while True:
+            # Comments may sit between '}' and 'else'
+            ahead = 0
+            while (self.peek(ahead) or ('',))[0] == 'comment':
+                ahead += 1
+            token = self.peek(ahead)
+            if token is None or token[0] != 'word' or token[1] != 'else':
+                break
+            comments = [self.comment() for _ in range(ahead)]
+            if (self.peek(1) or ('', ''))[1] == 'if':
+                branches.append(self.branch('else if', comments))
+            else:
+                branches.append(self.branch('else', comments))
+                break
+        return self.node(Conditional(branches), start)
+
+    def branch(self, kind, comments=()):
+        offset = self.peek()[2]
+        self.index += len(kind.split())
+        condition = None
+        if kind != 'else':
+            condition = self.condition()
+        self.expect('{', f"'{{' to open the {kind} block")
+        body = self.body()
+        self.expect('}')
+        return self.node(Branch(kind, condition, body, comments), offset)
+
+    def condition(self):
+        """The tokens up to the '{' that opens the block, outside brackets and parentheses."""
+        first = self.index
+        depth = 0
+        while True:
+            token = self.peek()
+            if token is None:
+                self.error("Expected '{' after condition")
+            kind, value, offset = token
+            if kind == 'punct':
+                if value in '[(':
+                    depth += 1
+                elif value in '])':
+                    depth -= 1
+                elif value == '{' and depth <= 0:
+                    break
+                elif value == '}':
+                    self.error("Unexpected '}' in condition")
+            self.index += 1
+        tokens = [token for token in self.tokens[first:self.index] if token[0] != 'comment']
+        if not tokens:
+            self.error("Missing condition")
+        comments = [self.node(Comment(value), offset, offset + len(value))
+                    for kind, value, offset in self.tokens[first:self.index] if kind == 'comment']
+        return self.node(Condition(_join_condition(tokens), comments), tokens[0][2])
+
+
+def parse(text):
+    """
+    Parses a Logstash pipeline into a Config node.
+
+    Raises ParseError (with the line and column) if text is not a valid pipeline.
+    """
+    return _Parser(text).config()
+
+
+def parse_cached(text):
+    """
+    Same as parse(text), but shares the result (or the ParseError) between
+    callers through parse_cache. The returned tree must not be modified.
+    """
+    return parse_cache.get_or_parse(text, parse)
+
+
+def walk(node):
+    """Yields node and all nodes below it, depth first in source order."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = _children(node)
+        if children:
+            stack.extend(reversed(children))
+
+
+def _children(node):
+    if isinstance(node, Config):
+        return node.sections
+    if isinstance(node, Section):
+        return node.body
+    if isinstance(node, Plugin):
+        return node.settings
+    if isinstance(node, Setting):
+        return [node.value]
+    if isinstance(node, Conditional):
+        return node.branches
+    if isinstance(node, Branch):
+        children = node.comments + ([node.condition] if node.condition is not None else [])
+        return children + node.body if children else node.body
+    if isinstance(node, Condition):
+        return node.comments
+    if isinstance(node, Array):
+        return node.items
+    if isinstance(node, Hash):
+        return node.entries
+    return None
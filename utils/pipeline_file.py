@@ -0,0 +1,217 @@
+import codecs
+import hashlib
+import mmap
+import os
+
+# Encodings tried in order for files without a byte order mark; latin-1 accepts any byte
+FALLBACK_ENCODINGS = ('utf-8', 'cp1252', 'latin-1')
+# The UTF-32 LE mark starts with the UTF-16 LE one, so it is checked first
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+# Bytes decoded at a time while reading lines or checking an encoding
+CHUNK_SIZE = 1024 * 1024
+# Bytes at the start of a file without a byte order mark that its encoding is guessed from
+SNIFF_SIZE = 64 * 1024
+
+
+class EncodingChanged(Exception):
+    """
+    Raised by PipelineFile.lines() when the file turns out not to be in the
+    encoding guessed from its start. The encoding has been corrected; read
+    the lines again.
+    """
+
+
+class PipelineFile:
+    """
+    A pipeline file memory-mapped for reading.
+
+    The encoding is taken from the byte order mark, or else the first of
+    FALLBACK_ENCODINGS that decodes the whole file. To avoid decoding the
+    file before formatting starts, that encoding is guessed from the first
+    SNIFF_SIZE bytes and checked while the file is decoded: if a later byte
+    does not fit, lines() raises EncodingChanged (and text() retries by
+    itself) with the encoding corrected. The line ending is that of the first
+    line. lines() decodes the file a chunk at a time, so the formatter can
+    start without a decoded copy of the whole file; encode() turns formatted
+    text back into bytes with the same encoding, byte order mark and line
+    endings.
+
+    With data (bytes) that content is used instead of the file at path, such
+    as the version of the file staged in git.
+
+    Use it as a context manager, or call close() when done.
+    """
+
+    def __init__(self, path, data=None):
+        self.path = path
+        if data is not None:
+            self._data = data
+            size = len(data)
+        else:
+            with open(path, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                # An empty file cannot be mapped
+                self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.size = size
+        # True once the encoding is known to decode the whole file
+        self._verified = False
+        self._text_chunks = None
+        self.bom, self.encoding = self._detect_encoding()
+        self.newline = self._detect_newline()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def _detect_encoding(self):
+        head = self._data[:4]
+        for bom, encoding in _BOMS:
+            if head.startswith(bom):
+                self._verified = True
+                return bom, encoding
+        whole = self.size <= SNIFF_SIZE
+        sample = self._data[:SNIFF_SIZE]
+        for encoding in FALLBACK_ENCODINGS:
+            try:
+                # A character cut off at the end of the sample is not an error
+                codecs.getincrementaldecoder(encoding)().decode(sample, final=whole)
+            except UnicodeDecodeError:
+                continue
+            self._verified = whole
+            return b"", encoding
+        self._verified = True
+        return b"", FALLBACK_ENCODINGS[-1]
+
+    def _correct_encoding(self):
+        """Moves on to the first of the remaining FALLBACK_ENCODINGS that decodes the whole file."""
+        candidates = FALLBACK_ENCODINGS[FALLBACK_ENCODINGS.index(self.encoding) + 1:]
+        self.encoding = next((encoding for encoding in candidates if self._decodes(encoding)),
+                             FALLBACK_ENCODINGS[-1])
+        self._verified = True
+        self.newline = self._detect_newline()
+
+    def _decodes(self, encoding):
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            for start in range(0, self.size, CHUNK_SIZE):
+                decoder.decode(self._data[start:start + CHUNK_SIZE])
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def _detect_newline(self):
+        # The encoding may only have been checked on a shorter sample
+        sample = codecs.getincrementaldecoder(self.encoding)(errors="replace").decode(
+            self._data[len(self.bom):len(self.bom) + CHUNK_SIZE])
+        newline = sample.find("\n")
+        if newline > 0 and sample[newline - 1] == "\r":
+            return "\r\n"
+        if newline < 0 and "\r" in sample:
+            return "\r"
+        return "\n"
+
+    def content_hash(self):
+        """SHA-256 hex digest of the raw bytes; for UTF-8 files the same as utils.cache.content_hash."""
+        return hashlib.sha256(self._data).hexdigest()
+
+    def lines(self, keep_text=False):
+        """
+        Yields the decoded lines with their line endings, split at the line
+        breaks of str.splitlines (so also at a lone '\\r'), like the tokenizer
+        does. With keep_text a text() call after the last line does not
+        decode the file again.
+
+        Raises:
+            EncodingChanged: The guessed encoding does not fit a later part of
+                the file; the lines yielded so far were decoded wrongly.
+        """
+        self._text_chunks = None
+        chunks = [] if keep_text else None
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        # Pieces of the line that continues in the next chunk, joined once the line is complete
+        pending = []
+        # None marks the final call that flushes the decoder
+        for start in [*range(len(self.bom), self.size, CHUNK_SIZE), None]:
+            try:
+                if start is None:
+                    chunk = decoder.decode(b"", final=True)
+                else:
+                    chunk = decoder.decode(self._data[start:start + CHUNK_SIZE])
+            except UnicodeDecodeError:
+                if self._verified:
+                    raise
+                self._correct_encoding()
+                raise EncodingChanged(self.encoding) from None
+            if not chunk:
+                continue
+            if chunks is not None:
+                chunks.append(chunk)
+            # A '\r' at the end of the previous chunk is a whole line ending unless a '\n' follows
+            if pending and pending[-1].endswith("\r") and not chunk.startswith("\n"):
+                yield "".join(pending)
+                pending = []
+            pieces = chunk.splitlines(True)
+            last = pieces[-1]
+            if last.endswith("\r") or last.splitlines()[0] == last:
+                pieces.pop()
+            else:
+                last = None
+            for piece in pieces:
+                if pending:
+                    pending.append(piece)
+                    yield "".join(pending)
+                    pending = []
+                else:
+                    yield piece
+            if last is not None:
+                pending.append(last)
+        self._verified = True
+        self._text_chunks = chunks
+        if pending:
+            yield "".join(pending)
+
+    def text(self):
+        """The whole decoded file with '\\n' line endings, as read from a file opened in text mode."""
+        if self._text_chunks is not None:
+            text = "".join(self._text_chunks)
+            self._text_chunks = None
+        else:
+            try:
+                text = self._decode()
+            except UnicodeDecodeError:
+                if self._verified:
+                    raise
+                self._correct_encoding()
+                text = self._decode()
+            self._verified = True
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+
+    def _decode(self):
+        with memoryview(self._data) as view:
+            return str(view[len(self.bom):], self.encoding)
+
+    def encode(self, text):
+        """text (with '\\n' line endings) as bytes in the encoding and line endings of this file."""
+        if self.newline != "\n":
+            text = text.replace("\n", self.newline)
+        return self.bom + text.encode(self.encoding)
+
+    def same_bytes(self, data):
+        """True if data equals the contents of the file, compared without copying the file."""
+        with memoryview(self._data) as view:
+            return view == data
@@ -0,0 +1,159 @@
+from utils.parser import Array, Bareword, Comment, Conditional, Hash, Number, Plugin, Section, String
+
+INDENT = "    "
+
+
+def print_config(config, max_length):
+    """
+    Returns the source text of a Config tree in the formatter's layout, with
+    values that do not fit in max_length characters split over several lines.
+
+    utils.formatter.format_structured formats a pipeline text this way.
+    """
+    printer = _Printer(max_length)
+    previous = None
+    for node in config.sections:
+        if isinstance(node, Section):
+            if previous is not None:
+                printer.blank_line()
+            printer.section(node)
+        else:
+            if isinstance(previous, Section):
+                printer.blank_line()
+            printer.comment(node, 0)
+        previous = node
+    return "\n".join(printer.lines)
+
+
+class _Printer:
+    """Collects the output lines while walking the tree."""
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.lines = []
+
+    def blank_line(self):
+        self.lines.append("")
+
+    def comment(self, node, depth):
+        if node.trailing and self.lines and self.lines[-1]:
+            self.lines[-1] += " " + node.text
+        else:
+            self.lines.append(INDENT * depth + node.text)
+
+    def section(self, node):
+        self.lines.append(f"{node.type} {{")
+        self.body(node.body, 1)
+        self.lines.append("}")
+
+    def body(self, items, depth):
+        for node in items:
+            if isinstance(node, Comment):
+                self.comment(node, depth)
+            elif isinstance(node, Conditional):
+                self.conditional(node, depth)
+            else:
+                self.plugin(node, depth)
+
+    def conditional(self, node, depth):
+        indent = INDENT * depth
+        for branch in node.branches:
+            for comment in branch.comments:
+                self.comment(comment, depth)
+            if branch.condition is None:
+                self.lines.append(f"{indent}else {{")
+            else:
+                # The condition is printed on one line, so its comments go above it
+                for comment in branch.condition.comments:
+                    self.lines.append(indent + comment.text)
+                self.lines.append(f"{indent}{branch.kind} {branch.condition.text} {{")
+            self.body(branch.body, depth + 1)
+            self.lines.append(f"{indent}}}")
+
+    def plugin(self, node, depth):
+        indent = INDENT * depth
+        if not node.settings:
+            self.lines.append(f"{indent}{node.name} {{}}")
+            return
+        self.lines.append(f"{indent}{node.name} {{")
+        self.settings(node.settings, depth + 1)
+        self.lines.append(f"{indent}}}")
+
+    def settings(self, items, depth):
+        for node in items:
+            if isinstance(node, Comment):
+                self.comment(node, depth)
+            elif isinstance(node, Plugin):
+                self.plugin(node, depth)
+            else:
+                self.setting(node, depth, INDENT * depth)
+
+    def setting(self, node, depth, prefix, suffix=""):
+        """Adds `name => value` at depth, starting the first line with prefix."""
+        name = node.name if node.name_quote is None else f"{node.name_quote}{node.name}{node.name_quote}"
+        self.value(node.value, depth, f"{prefix}{name} => ", suffix)
+
+    def value(self, node, depth, prefix, suffix=""):
+        """Adds node as a value that follows prefix on the current line."""
+        inline = _inline(node)
+        if inline is not None and len(prefix) + len(inline) + len(suffix) <= self.max_length:
+            self.lines.append(prefix + inline + suffix)
+            return
+
+        indent = INDENT * depth
+        inner = INDENT * (depth + 1)
+        if isinstance(node, Array):
+            self.lines.append(prefix + "[")
+            values = [item for item in node.items if not isinstance(item, Comment)]
+            last = values[-1] if values else None
+            for item in node.items:
+                if isinstance(item, Comment):
+                    self.comment(item, depth + 1)
+                else:
+                    self.value(item, depth + 1, inner, "" if item is last else ",")
+            self.lines.append(f"{indent}]{suffix}")
+        elif isinstance(node, Hash):
+            self.lines.append(prefix + "{")
+            for entry in node.entries:
+                if isinstance(entry, Comment):
+                    self.comment(entry, depth + 1)
+                else:
+                    self.setting(entry, depth + 1, inner)
+            self.lines.append(f"{indent}}}{suffix}")
+        elif isinstance(node, Plugin):
+            self.lines.append(f"{prefix}{node.name} {{")
+            self.settings(node.settings, depth + 1)
+            self.lines.append(f"{indent}}}{suffix}")
+        else:
+            # Scalars are never broken up
+            self.lines.append(prefix + inline + suffix)
+
+
+def _inline(node):
+    """Returns node as a single line, or None if it has to span several lines."""
+    if isinstance(node, String):
+        return f"{node.quote}{node.value}{node.quote}"
+    if isinstance(node, (Number, Bareword)):
+        return node.text
+    if isinstance(node, Array):
+        parts = []
+        for item in node.items:
+            text = None if isinstance(item, Comment) else _inline(item)
+            if text is None:
+                return None
+            parts.append(text)
+        return "[" + ", ".join(parts) + "]"
+    if isinstance(node, (Hash, Plugin)):
+        entries = node.entries if isinstance(node, Hash) else node.settings
+        if len(entries) > 1 or any(isinstance(entry, (Comment, Plugin)) for entry in entries):
+            return None
+        opener = "{" if isinstance(node, Hash) else f"{node.name} {{"
+        if not entries:
+            return opener + "}"
+        entry = entries[0]
+        value = _inline(entry.value)
+        if value is None:
+            return None
+        name = entry.name if entry.name_quote is None else f"{entry.name_quote}{entry.name}{entry.name_quote}"
+        return f"{opener} {name} => {value} }}"
+    return None
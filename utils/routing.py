@@ -0,0 +1,404 @@
+import json
+import re
+import warnings
+from functools import lru_cache
+
+from utils.conditions import (
+    COMPARISON_OPERATORS, MATCH_OPERATORS, Boolean, Call, Comparison, Field, List, Literal, Not, Regex,
+    parse_condition,
+)
+from utils.parser import Conditional, Section
+
+# Sections whose conditionals every event passes through; Logstash allows no conditionals in inputs
+ROUTED_SECTIONS = ("filter", "output")
+# Chains listed in a report, the most expensive first
+REPORT_CHAINS = 10
+# A new order is only suggested if it saves at least this share of the comparisons of the chain
+_MIN_SAVING = 0.01
+
+
+class Chain:
+    """
+    The cost of one if / else if / else chain.
+
+    weight is the weight of the events that reach the chain, comparisons the
+    comparisons they need in total and taken the weight per branch.
+    outcomes maps the (matched, comparisons) of every condition for an event
+    to the weight of such events; overlap is the weight of events that match
+    more than one condition. expressions holds the parsed condition of each
+    branch (None for else or a condition that does not parse). order is the
+    suggested order of the branches
+    (indexes into conditional.branches) with its total suggested_comparisons,
+    or None.
+    """
+
+    __slots__ = ('conditional', 'section', 'expressions', 'weight', 'comparisons', 'taken', 'outcomes',
+                 'overlap', 'order', 'suggested_comparisons')
+
+    def __init__(self, conditional, section):
+        self.conditional = conditional
+        self.section = section
+        self.expressions = [_branch_expression(branch) for branch in conditional.branches]
+        self.weight = 0
+        self.comparisons = 0
+        self.taken = [0] * len(conditional.branches)
+        self.outcomes = {}
+        self.overlap = 0
+        self.order = None
+        self.suggested_comparisons = None
+
+
+class RoutingReport:
+    """
+    The result of analyze_routing. total_weight is the weight of all events
+    (1 without a sample), chains the Chain of every conditional that events
+    reach, in source order.
+    """
+
+    __slots__ = ('total_weight', 'chains', 'sampled')
+
+    def __init__(self, total_weight, chains, sampled):
+        self.total_weight = total_weight
+        self.chains = chains
+        self.sampled = sampled
+
+    def comparisons_per_event(self):
+        return sum(chain.comparisons for chain in self.chains) / self.total_weight if self.total_weight else 0.0
+
+    def suggested_per_event(self):
+        """Comparisons per event with every suggested order applied."""
+        total = sum(chain.comparisons if chain.order is None else chain.suggested_comparisons
+                    for chain in self.chains)
+        return total / self.total_weight if self.total_weight else 0.0
+
+
+def load_event_sample(path):
+    """
+    Reads a sample of events for analyze_routing.
+
+    The file holds either tag frequencies, a JSON object of numbers like
+    {"dfs": 1200, "wsus": 30} (every event is taken to carry one of these
+    tags), or events: a JSON array of objects or NDJSON with one object per
+    line. Identical events are counted once with a higher weight.
+
+    Returns:
+        sample (list): (event, weight) pairs.
+
+    Raises ValueError if the file is not in one of these forms.
+    """
+    with open(path, "r", encoding="utf-8-sig") as file:
+        text = file.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if line.strip():
+                try:
+                    data.append(json.loads(line))
+                except ValueError as e:
+                    raise ValueError(f"Line {number}: Not a JSON event: {e}")
+
+    if isinstance(data, dict) and data and all(isinstance(value, (int, float)) for value in data.values()):
+        if any(value < 0 for value in data.values()):
+            raise ValueError("Tag frequencies cannot be negative")
+        return [({"tags": [tag]}, weight) for tag, weight in data.items() if weight > 0]
+
+    events = [data] if isinstance(data, dict) else data
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        raise ValueError("Expected tag frequencies, or events as a JSON array or NDJSON of objects")
+    weights = {}
+    first = {}
+    for event in events:
+        key = json.dumps(event, sort_keys=True)
+        weights[key] = weights.get(key, 0) + 1
+        first.setdefault(key, event)
+    return [(first[key], weight) for key, weight in weights.items()]
+
+
+@lru_cache(maxsize=1024)
+def _compiled(pattern):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            return re.compile(pattern)
+    except re.error:
+        return None
+
+
+def _value(expression, event):
+    if isinstance(expression, Literal):
+        return expression.value
+    if isinstance(expression, Field):
+        value = event
+        for name in expression.path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(name)
+        return value
+    if isinstance(expression, List):
+        return [_value(item, event) for item in expression.items]
+    return None
+
+
+def _compare(op, left, right):
+    if op == '==':
+        return left == right
+    if op == '!=':
+        return left != right
+    try:
+        return {'<': left < right, '>': left > right, '<=': left <= right, '>=': left >= right}[op]
+    except TypeError:
+        return False
+
+
+def evaluate(expression, event):
+    """
+    Evaluates a parsed condition against an event (a dict, like the JSON of a
+    Logstash event), short-circuiting 'and' and 'or' as Logstash does.
+    Method calls evaluate to nothing.
+
+    Returns:
+        (matched, comparisons): the outcome and the number of comparisons,
+        field tests and regular expression matches it took.
+    """
+    if isinstance(expression, Boolean):
+        comparisons = 0
+        if expression.op in ('and', 'or'):
+            stop = expression.op == 'or'
+            for operand in expression.operands:
+                matched, count = evaluate(operand, event)
+                comparisons += count
+                if matched == stop:
+                    return stop, comparisons
+            return not stop, comparisons
+        (left, left_count), (right, right_count) = [evaluate(operand, event) for operand in expression.operands]
+        matched = left != right if expression.op == 'xor' else not (left and right)
+        return matched, left_count + right_count
+    if isinstance(expression, Not):
+        matched, comparisons = evaluate(expression.operand, event)
+        return not matched, comparisons
+    if isinstance(expression, Comparison):
+        left = _value(expression.left, event)
+        right = expression.right
+        if expression.op in MATCH_OPERATORS:
+            pattern = _compiled(right.pattern if isinstance(right, Regex) else right.value)
+            found = isinstance(left, str) and pattern is not None and pattern.search(left) is not None
+            return found == (expression.op == '=~'), 1
+        right = _value(right, event)
+        if expression.op in COMPARISON_OPERATORS:
+            return _compare(expression.op, left, right), 1
+        if isinstance(right, list):
+            found = left in right
+        elif isinstance(right, str) and isinstance(left, str):
+            found = left in right
+        else:
+            found = False
+        return found == (expression.op == 'in'), 1
+    if isinstance(expression, Call):
+        return False, 1
+    value = _value(expression, event)
+    return value is not None and value is not False, 1
+
+
+def _test_count(expression):
+    """The number of comparisons in expression, all of them evaluated."""
+    if isinstance(expression, Boolean):
+        return sum(_test_count(operand) for operand in expression.operands)
+    if isinstance(expression, Not):
+        return _test_count(expression.operand)
+    return 1
+
+
+def _branch_expression(branch):
+    if branch.condition is None:
+        return None
+    expression, _ = parse_condition(branch.condition.text)
+    return expression
+
+
+class _Simulator:
+    """Sends weighted events through the conditionals of the routed sections."""
+
+    def __init__(self):
+        self.chains = {}
+
+    def chain(self, conditional, section):
+        chain = self.chains.get(id(conditional))
+        if chain is None:
+            chain = self.chains[id(conditional)] = Chain(conditional, section)
+        return chain
+
+    def body(self, section, items, event, weight):
+        for node in items:
+            if isinstance(node, Conditional):
+                self.conditional(section, node, event, weight)
+
+    def conditional(self, section, node, event, weight):
+        chain = self.chain(node, section)
+        outcome = []
+        taken = None
+        comparisons = 0
+        for index, branch in enumerate(node.branches):
+            if branch.condition is None:
+                if taken is None:
+                    taken = index
+                break
+            expression = chain.expressions[index]
+            # Every condition is evaluated, so other orders can be costed from the same outcomes
+            matched, count = evaluate(expression, event) if expression is not None else (False, 0)
+            outcome.append((matched, count))
+            if taken is None:
+                comparisons += count
+                if matched:
+                    taken = index
+        outcome = tuple(outcome)
+        chain.weight += weight
+        chain.comparisons += comparisons * weight
+        chain.outcomes[outcome] = chain.outcomes.get(outcome, 0) + weight
+        if sum(matched for matched, _ in outcome) > 1:
+            chain.overlap += weight
+        if taken is not None:
+            chain.taken[taken] += weight
+            self.body(section, node.branches[taken].body, event, weight)
+
+
+def _uniform(chains, section, items, reach):
+    """
+    Costs the chains without a sample: every branch of a chain (and falling
+    through one without else) is taken equally often, and conditions
+    evaluate all their comparisons.
+    """
+    for node in items:
+        if not isinstance(node, Conditional):
+            continue
+        chain = Chain(node, section)
+        chains.append(chain)
+        outcomes = len(node.branches) + (node.branches[-1].condition is not None)
+        share = reach / outcomes
+        spent = 0
+        for index, expression in enumerate(chain.expressions):
+            if expression is not None:
+                spent += _test_count(expression)
+            chain.comparisons += spent * share
+            chain.taken[index] = share
+            _uniform(chains, section, node.branches[index].body, share)
+        if node.branches[-1].condition is not None:
+            chain.comparisons += spent * share
+        chain.weight = reach
+
+
+def _order_comparisons(outcomes, order):
+    total = 0
+    for outcome, weight in outcomes.items():
+        for index in order:
+            matched, count = outcome[index]
+            total += count * weight
+            if matched:
+                break
+    return total
+
+
+def suggest_order(chain):
+    """
+    Orders the conditions of a sampled chain by how often they match per
+    comparison they cost, which minimizes the expected comparisons when no
+    event matches two of them. An else stays last. Sets chain.order and
+    chain.suggested_comparisons if that saves comparisons and the sample
+    has no event that matches more than one condition.
+    """
+    branches = chain.conditional.branches
+    conditions = len(branches) - (branches[-1].condition is None)
+    if conditions < 2 or chain.overlap or not chain.weight:
+        return
+    if None in chain.expressions[:conditions]:
+        return
+    matches = [0] * conditions
+    costs = [0] * conditions
+    for outcome, weight in chain.outcomes.items():
+        for index, (matched, count) in enumerate(outcome):
+            matches[index] += matched * weight
+            costs[index] += count * weight
+
+    def rank(index):
+        return -(matches[index] / costs[index]) if costs[index] else float("-inf")
+
+    order = sorted(range(conditions), key=rank)
+    suggested = _order_comparisons(chain.outcomes, order)
+    if suggested <= chain.comparisons * (1 - _MIN_SAVING):
+        chain.order = order + list(range(conditions, len(branches)))
+        chain.suggested_comparisons = suggested
+
+
+def analyze_routing(config, sample=None):
+    """
+    Estimates how many comparisons the conditionals of a parsed pipeline cost
+    per event, chain by chain, and suggests branch orders that need fewer.
+
+    With a sample (see load_event_sample) every event is sent through the
+    filter and output conditionals as it is; changes filters make to events
+    are not followed. Without one, all branches are taken equally often and
+    no orders are suggested.
+
+    Returns:
+        report (RoutingReport)
+    """
+    sections = [section for section in config.sections
+                if isinstance(section, Section) and section.type in ROUTED_SECTIONS]
+    if sample is None:
+        chains = []
+        for section in sections:
+            _uniform(chains, section.type, section.body, 1.0)
+        return RoutingReport(1.0, chains, False)
+
+    simulator = _Simulator()
+    for event, weight in sample:
+        for section in sections:
+            simulator.body(section.type, section.body, event, weight)
+    chains = sorted(simulator.chains.values(), key=lambda chain: chain.conditional.start)
+    for chain in chains:
+        suggest_order(chain)
+    return RoutingReport(sum(weight for _, weight in sample), chains, True)
+
+
+def _branch_label(branch):
+    return "else" if branch.condition is None else branch.condition.text
+
+
+def format_routing_report(report, limit=REPORT_CHAINS):
+    """
+    The report as text lines: the comparisons per event, then the chains
+    that cost the most with their branches and any suggested order.
+    """
+    total = report.total_weight or 1
+    per_event = report.comparisons_per_event()
+    if report.sampled:
+        lines = [f"{per_event:.2f} comparisons per event over {report.total_weight:g} sampled events"]
+        suggested = report.suggested_per_event()
+        if suggested < per_event:
+            lines[0] += f", {suggested:.2f} with the suggested orders"
+    else:
+        lines = [f"{per_event:.2f} comparisons per event, assuming all branches are taken equally often "
+                 f"(give an event sample for suggested orders)"]
+
+    chains = sorted((chain for chain in report.chains if chain.comparisons),
+                    key=lambda chain: chain.comparisons, reverse=True)
+    for chain in chains[:limit]:
+        branches = chain.conditional.branches
+        lines.append(f"Line {chain.conditional.line}: {chain.section} chain of {len(branches)} "
+                     f"{'branch' if len(branches) == 1 else 'branches'}, "
+                     f"reached by {chain.weight / total:.0%} of events, "
+                     f"{chain.comparisons / total:.2f} comparisons per event")
+        if chain.order is not None:
+            lines.append(f"    Suggested order, {chain.suggested_comparisons / total:.2f} comparisons per event:")
+            for index in chain.order:
+                share = chain.taken[index] / chain.weight
+                lines.append(f"      Line {branches[index].line}: {_branch_label(branches[index])} ({share:.0%})")
+        elif chain.overlap:
+            lines.append(f"    Not reordered: {chain.overlap / chain.weight:.0%} of its events match "
+                         f"more than one branch")
+    if len(chains) > limit:
+        lines.append(f"... and {len(chains) - limit} more chains")
+    if any(chain.order is not None for chain in chains[:limit]):
+        lines.append("Only reorder branches that no event can match together; the sample cannot prove that")
+    return lines
@@ -0,0 +1,76 @@
+import re
+
+# Structural tokens. Every other token is either a whitespace run or a run of
+# plain text (identifiers, values, punctuation, comment text).
+ARROW = '=>'       # the assignment operator
+TEMPLATE = '%{'    # the opener of a template variable like %{field}
+LBRACE = '{'
+RBRACE = '}'
+QUOTE = '"'
+
+# Same line boundaries as str.splitlines(), so line numbers match the old formatter.
+_NEWLINES = frozenset(['\r\n', '\n', '\r', '\x0b', '\x0c', '\x1c', '\x1d', '\x1e', '\x85', '\u2028', '\u2029'])
+
+_TOKEN_RE = re.compile(
+    # plain text
+    r'[^\s{}"=%]+'
+    # whitespace inside a line
+    r'|[^\S\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]+'
+    # operators, braces and quotes
+    r'|=>|%\{|[{}"=%]'
+    # line breaks
+    r'|\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]'
+)
+
+
+def tokenize(text):
+    """
+    Splits a Logstash configuration into tokens in a single pass.
+
+    Tokens are plain strings: '=>', '%{', '{', '}' and '"' are emitted on their
+    own, whitespace and plain text are emitted as runs. Concatenating the
+    tokens of a line gives back the original line. Line boundaries follow
+    str.splitlines(), so a trailing newline does not produce an extra line.
+
+    Yields:
+        (line_number, tokens) for every line.
+    """
+    tokens = []
+    line_number = 1
+    for token in _TOKEN_RE.findall(text):
+        if token in _NEWLINES:
+            yield line_number, tokens
+            tokens = []
+            line_number += 1
+        else:
+            tokens.append(token)
+    if tokens:
+        yield line_number, tokens
+
+
+def tokenize_line(line):
+    """Tokenizes a single line (which must not contain line breaks)."""
+    return _TOKEN_RE.findall(line)
+
+
+def is_space(token):
+    """True for whitespace tokens."""
+    return token[0].isspace()
+
+
+def is_word_end(token):
+    """True if the token ends in a word character (the \\w class of re)."""
+    char = token[-1]
+    return char.isalnum() or char == '_'
+
+
+def tokenize_lines(lines):
+    """
+    Like tokenize(), but for an iterable of lines (with or without line endings),
+    such as an open file.
+    """
+    line_number = 0
+    for line in lines:
+        for part in line.splitlines() or ['']:
+            line_number += 1
+            yield line_number, _TOKEN_RE.findall(part)
@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+
+from utils.conditions import check_conditions
+from utils.grok import check_grok
+from utils.parser import (
+    Array, Bareword, Comment, Conditional, Hash, Number, ParseError, Plugin, Section, String, parse_cached,
+)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logstash_plugins.json")
+
+# Node types accepted for each schema type. Logstash also accepts a single
+# value where it expects an array, an array of key/value pairs for a hash,
+# strings for numbers and booleans and a quoted codec name.
+_TYPE_NODES = {
+    "string": (String, Bareword, Number),
+    "number": (Number, String, Bareword),
+    "boolean": (Bareword, String),
+    "array": (Array, String, Bareword, Number),
+    "hash": (Hash, Array),
+    "codec": (Bareword, String, Plugin),
+}
+# Setting types that may be repeated in a plugin; Logstash merges the values
+_REPEATABLE_TYPES = frozenset(["hash", "array"])
+_NODE_NAMES = {
+    String: "a string", Bareword: "a bare word", Number: "a number", Array: "an array",
+    Hash: "a hash", Plugin: "a plugin block",
+}
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class SchemaIndex:
+    """
+    The plugin schema compiled for lookups.
+
+    plugins maps (section, plugin name) to a dict of setting name to
+    (accepted node types, type names, repeatable); codecs use the section
+    'codec'. The common settings of each section are merged into every plugin.
+    """
+
+    def __init__(self, schema):
+        common = schema.get("common", {})
+        self.plugins = {}
+        for section in ("input", "filter", "output", "codec"):
+            shared = common.get(section, {})
+            for name, settings in schema.get(section, {}).items():
+                merged = dict(shared)
+                merged.update(settings)
+                self.plugins[(section, name)] = {
+                    setting: _compile_type(type_spec) for setting, type_spec in merged.items()
+                }
+
+    def settings(self, section, name):
+        """Returns the compiled settings of a plugin, or None for an unknown plugin."""
+        return self.plugins.get((section, name))
+
+
+def _compile_type(type_spec):
+    types = type_spec.split("|")
+    nodes = tuple({node for type_name in types for node in _TYPE_NODES[type_name]})
+    return nodes, types, bool(_REPEATABLE_TYPES.intersection(types))
+
+
+def load_schema(path=SCHEMA_PATH):
+    with open(path, "r", encoding="utf-8") as file:
+        return SchemaIndex(json.load(file))
+
+
+def get_schema_index():
+    """The SchemaIndex of the bundled schema, compiled on first use and shared afterwards."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = load_schema()
+        return _index
+
+
+def _is_dynamic(text):
+    """True for values resolved at runtime, like ${ENV_VAR} or %{field}."""
+    return "${" in text or "%{" in text
+
+
+def _type_matches(value, nodes, types):
+    if not isinstance(value, nodes):
+        return False
+    if isinstance(value, (String, Bareword)) and not ("string" in types or "array" in types):
+        text = value.value if isinstance(value, String) else value.text
+        if _is_dynamic(text):
+            return True
+        if "number" in types and _is_number(text):
+            return True
+        if "boolean" in types and text in ("true", "false"):
+            return True
+        if "codec" in types:
+            return True
+        return False
+    return True
+
+
+def _is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+class _Validator:
+    def __init__(self, index):
+        self.index = index
+        self.messages = []
+
+    def warn(self, node, message):
+        self.messages.append(f"Warning: Line {node.line}: {message}")
+
+    def body(self, section, items):
+        for node in items:
+            if isinstance(node, Plugin):
+                self.plugin(section, node)
+            elif isinstance(node, Conditional):
+                for branch in node.branches:
+                    self.body(section, branch.body)
+
+    def plugin(self, section, node):
+        known = self.index.settings(section, node.name)
+        if known is None:
+            what = "codec" if section == "codec" else f"{section} plugin"
+            self.warn(node, f"Unknown {what} '{node.name}'")
+        label = f"codec '{node.name}'" if section == "codec" else f"{section} plugin '{node.name}'"
+
+        seen = set()
+        for setting in node.settings:
+            if isinstance(setting, Comment):
+                continue
+            if isinstance(setting, Plugin):
+                self.warn(setting, f"Plugin '{setting.name}' cannot be nested inside {label}")
+                continue
+            if known is None:
+                continue
+            spec = known.get(setting.name)
+            if spec is None:
+                self.warn(setting, f"Unknown setting '{setting.name}' for {label}")
+                continue
+            nodes, types, repeatable = spec
+            if setting.name in seen and not repeatable:
+                self.warn(setting, f"Duplicate setting '{setting.name}' in {label}")
+            seen.add(setting.name)
+            value = setting.value
+            if not _type_matches(value, nodes, types):
+                expected = " or ".join(types)
+                self.warn(setting, f"Setting '{setting.name}' of {label} should be {expected}, "
+                                   f"found {_NODE_NAMES.get(type(value), 'a value')}")
+            elif "codec" in types:
+                self.codec(value)
+
+    def codec(self, value):
+        if isinstance(value, Plugin):
+            self.plugin("codec", value)
+        elif isinstance(value, (Bareword, String)):
+            name = value.text if isinstance(value, Bareword) else value.value
+            if self.index.settings("codec", name) is None:
+                self.warn(value, f"Unknown codec '{name}'")
+
+
+def validate_config(config, index=None):
+    """
+    Checks the plugins of a parsed pipeline against the plugin schema.
+
+    Reports unknown plugins and codecs, unknown and duplicate settings,
+    values of the wrong type and plugins nested inside plugins. The patterns
+    of grok filters are compiled with utils.grok.check_grok and the
+    conditions of if / else if chains are checked with
+    utils.conditions.check_conditions.
+
+    Returns:
+        messages (list): Warnings like 'Warning: Line N: ...' and errors like
+            'Line N: ...' for grok patterns that do not compile and
+            conditions that do not parse.
+    """
+    validator = _Validator(index or get_schema_index())
+    for section in config.sections:
+        if isinstance(section, Section):
+            validator.body(section.type, section.body)
+    return validator.messages + check_grok(config) + check_conditions(config)
+
+
+def validate_pipeline(pipeline_text):
+    """
+    Same as validate_config for the text of a pipeline, using the shared parse cache.
+    A pipeline that cannot be parsed gives a single warning.
+    """
+    try:
+        config = parse_cached(pipeline_text)
+    except ParseError as e:
+        return [f"Warning: {e} - plugin settings were not validated"]
+    return validate_config(config)
@@ -0,0 +1,244 @@
+import inspect
+import multiprocessing
+import queue
+import time
+from multiprocessing.connection import wait
+
+# Seconds a terminated worker gets to exit before it is killed
+_STOP_TIMEOUT = 1
+
+
+def _serve(connection, initializer, initargs):
+    """Main loop of a worker process: runs one (func, args) job at a time."""
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            func, args = connection.recv()
+        except EOFError:
+            return
+        try:
+            result = func(*args)
+            if inspect.isgenerator(result):
+                for item in result:
+                    connection.send(('item', item))
+                result = None
+            reply = ('done', result)
+        except Exception as e:
+            reply = ('error', e)
+        try:
+            connection.send(reply)
+        except Exception as e:
+            # The result or the exception could not be pickled
+            connection.send(('error', RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    """A formatter process with the pipe its jobs are sent over."""
+
+    def __init__(self, context, initializer, initargs):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, initializer, initargs), daemon=True)
+        self.process.start()
+        child.close()
+
+    def submit(self, func, args):
+        self.connection.send((func, args))
+
+    def receive(self):
+        """The next (kind, value) message; a process that died is reported as an error."""
+        try:
+            return self.connection.recv()
+        except (EOFError, OSError):
+            return 'error', RuntimeError("The formatter process stopped unexpectedly")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join(_STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class WorkerPool:
+    """
+    A fixed number of formatter processes that each run one job at a time.
+
+    Unlike a ProcessPoolExecutor, a job that runs past its deadline is really
+    stopped: its process is terminated and replaced by a new one, so a
+    pathological input cannot keep a worker busy. A worker is held from
+    acquire() until it is released, which makes the pool its own limit on the
+    jobs in flight. Processes are started on first use.
+
+    Pools in processes forked from the same parent can share a limit: slots is
+    a multiprocessing semaphore created before the fork, and a worker is only
+    handed out together with one of its slots.
+    """
+
+    def __init__(self, size, initializer=None, initargs=(), slots=None):
+        self.size = size
+        self._initializer = initializer
+        self._initargs = initargs
+        self._slots = slots
+        self._context = multiprocessing.get_context()
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)  # A slot whose process has not been started (or was stopped)
+
+    def _start(self, worker):
+        if worker is not None and worker.process.is_alive():
+            return worker
+        if worker is not None:
+            worker.stop()
+        try:
+            return _Worker(self._context, self._initializer, self._initargs)
+        except Exception:
+            self._idle.put(None)
+            raise
+
+    def acquire(self, count=1, timeout=None):
+        """
+        Takes up to count idle workers: waits at most timeout seconds for the
+        first one, the others are only taken if they are idle right now.
+
+        Returns:
+            workers (list): Empty if no worker (or shared slot) became idle within timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._take_slot(timeout):
+            return []
+        try:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            workers = [self._start(self._idle.get(timeout=remaining))]
+        except queue.Empty:
+            self._give_slot()
+            return []
+        except Exception:
+            self._give_slot()
+            raise
+        while len(workers) < count and self._take_slot(0):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                self._give_slot()
+                break
+            try:
+                workers.append(self._start(worker))
+            except Exception:
+                self._give_slot()
+                self.release(workers)
+                raise
+        return workers
+
+    def _take_slot(self, timeout):
+        if self._slots is None:
+            return True
+        if timeout is None:
+            return self._slots.acquire()
+        return self._slots.acquire(timeout=timeout) if timeout > 0 else self._slots.acquire(False)
+
+    def _give_slot(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def release(self, workers, stop=False):
+        """Returns workers to the pool; with stop their processes are terminated first."""
+        for worker in workers:
+            if stop:
+                worker.stop()
+                worker = None
+            self._idle.put(worker)
+            self._give_slot()
+
+    def run(self, workers, func, arg_lists, timeout):
+        """
+        Runs func(*args) for each of arg_lists on its own worker, at most one
+        per worker, and releases the workers.
+
+        Returns:
+            results (list): In the order of arg_lists.
+
+        Raises:
+            TimeoutError: Not all jobs finished within timeout seconds. The
+                workers that were still running have been terminated.
+        """
+        deadline = time.monotonic() + timeout
+        busy = {}
+        results = [None] * len(arg_lists)
+        error = None
+        try:
+            for index, (worker, args) in enumerate(zip(workers, arg_lists)):
+                worker.submit(func, args)
+                busy[worker.connection] = index, worker
+            while busy and error is None:
+                ready = wait(list(busy), timeout=max(0, deadline - time.monotonic()))
+                if not ready:
+                    raise TimeoutError()
+                for connection in ready:
+                    index, worker = busy.pop(connection)
+                    kind, value = worker.receive()
+                    if kind == 'error':
+                        error = value
+                    else:
+                        results[index] = value
+        finally:
+            running = [worker for _, worker in busy.values()]
+            self.release([worker for worker in workers if worker not in running])
+            self.release(running, stop=True)
+        if error is not None:
+            raise error
+        return results
+
+    def stream(self, worker, func, args, timeout):
+        """
+        Starts the generator function func(*args) on worker.
+
+        Returns:
+            An iterator over the items of the generator as they arrive. It
+            releases the worker when the generator is exhausted or when it is
+            closed, also if it was never iterated; iterating raises
+            TimeoutError after timeout seconds, with the worker terminated.
+        """
+        return _Stream(self, worker, func, args, timeout)
+
+
+class _Stream:
+    """The items of a generator that runs on a pool worker; see WorkerPool.stream()."""
+
+    def __init__(self, pool, worker, func, args, timeout):
+        self._pool = pool
+        self._worker = worker
+        self._deadline = time.monotonic() + timeout
+        try:
+            worker.submit(func, args)
+        except Exception:
+            self.close()
+            raise
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        worker = self._worker
+        if worker is None:
+            raise StopIteration
+        if not worker.connection.poll(max(0, self._deadline - time.monotonic())):
+            self.close()
+            raise TimeoutError()
+        kind, value = worker.receive()
+        if kind == 'item':
+            return value
+        self._release(stop=False)
+        if kind == 'error':
+            raise value
+        raise StopIteration
+
+    def _release(self, stop):
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            self._pool.release([worker], stop=stop)
+
+    def close(self):
+        """Stops the generator if it has not finished and releases the worker."""
+        self._release(stop=True)